@@ -7,15 +7,49 @@ Analizza file PHP per trovare errori comuni di sintassi
 import os
 import re
 import sys
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, scrolledtext
 from typing import List, Dict, Tuple, Optional
 from dataclasses import dataclass
 import threading
 import importlib.util
 import json
+import traceback
+import contextlib
+import io
+from concurrent.futures import ProcessPoolExecutor
 
-@dataclass
+# matches_globs non è usata qui: è riesportata per i plugin, come PhpFileState
+from phpstate import PhpFileState, matches_globs
+
+# Tkinter viene importato solo quando serve l'interfaccia grafica (vedi _import_tk),
+# così l'analisi da riga di comando non paga il caricamento di Tk
+tk = ttk = filedialog = messagebox = scrolledtext = None
+
+def _import_tk():
+    """Importa i moduli Tkinter nei globali del modulo"""
+    global tk, ttk, filedialog, messagebox, scrolledtext
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox, scrolledtext
+
+# Stringhe e commenti PHP in un'unica regex: il motore compilato di re sostituisce
+# l'automa scritto carattere per carattere; quelli non chiusi arrivano a fine testo
+_STRINGS_AND_COMMENTS_RE = re.compile(
+    r"/\*.*?(?:\*/|\Z)"                    # commento multi-linea
+    r"|//[^\n]*"                            # commento single-line
+    r"|\"(?:\\.|[^\"\\])*(?:\"|\\?\Z)"      # stringa tra virgolette doppie
+    r"|'(?:\\.|[^'\\])*(?:'|\\?\Z)",         # stringa tra virgolette singole
+    re.DOTALL
+)
+_NON_NEWLINE_RE = re.compile(r'[^\n]')
+
+def _blank(match) -> str:
+    """Sostituisce il testo trovato con spazi, mantenendo gli a capo e quindi le posizioni"""
+    text = match.group(0)
+    if '\n' not in text:
+        return ' ' * len(text)
+    return _NON_NEWLINE_RE.sub(' ', text)
+
+# slots riduce la memoria di ogni errore; non è frozen perché call_hook assegna la categoria
+@dataclass(slots=True)
 class SyntaxError:
     line_number: int
     line_content: str
@@ -59,75 +93,90 @@ class PluginBase:
         """Ritorna la configurazione predefinita del plugin"""
         return {}
 
+# Cartella dei plugin accanto a questo file, indipendente dalla directory corrente
+PLUGINS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plugins")
+
 class PluginManager:
     """Gestore dei plugin per l'analizzatore PHP"""
     
-    def __init__(self, plugins_dir="plugins"):
+    def __init__(self, plugins_dir=PLUGINS_DIR):
         self.plugins_dir = plugins_dir
         self.plugins = {}
         self.hooks = {}
         self.config_file = os.path.join(plugins_dir, "config.json")
         self.plugin_configs = {}
+        # Moduli plugin già importati: filepath -> (data di modifica, modulo)
+        self._module_cache = {}
         
         # Carica la configurazione dei plugin
         self._load_config()
     
-    def diagnose_plugins_directory(self):
-        """Stampa informazioni diagnostiche sulla directory dei plugin"""
-        print(f"\n=== Diagnostica directory plugin ===")
+    def diagnose_plugins_directory(self, out=print):
+        """Stampa informazioni diagnostiche sulla directory dei plugin (una linea per ogni chiamata a out)"""
+        out(f"\n=== Diagnostica directory plugin ===")
         plugins_dir = os.path.abspath(self.plugins_dir)
-        print(f"Directory plugin: {plugins_dir}")
+        out(f"Directory plugin: {plugins_dir}")
         
         if not os.path.exists(plugins_dir):
-            print(f"La directory {plugins_dir} non esiste!")
+            out(f"La directory {plugins_dir} non esiste!")
             return
         
         files = os.listdir(plugins_dir)
-        print(f"Numero di file nella directory: {len(files)}")
+        out(f"Numero di file nella directory: {len(files)}")
         
         python_files = [f for f in files if f.endswith('.py') and not f.startswith('__')]
-        print(f"File Python trovati: {len(python_files)}")
+        out(f"File Python trovati: {len(python_files)}")
         for py_file in python_files:
-            print(f"  - {py_file}")
+            out(f"  - {py_file}")
         
         other_files = [f for f in files if not (f.endswith('.py') and not f.startswith('__'))]
         if other_files:
-            print(f"Altri file trovati: {len(other_files)}")
+            out(f"Altri file trovati: {len(other_files)}")
             for other_file in other_files:
-                print(f"  - {other_file}")
+                out(f"  - {other_file}")
         
-        print("=== Fine diagnostica ===\n")
+        out("=== Fine diagnostica ===\n")
     
-    def _load_plugin_from_file(self, filepath):
-        """Carica un plugin da un file Python"""
+    def _load_plugin_from_file(self, filepath, plugins):
+        """Carica un plugin da un file Python e lo aggiunge al dizionario plugins"""
         plugin_name = os.path.splitext(os.path.basename(filepath))[0]
-        spec = importlib.util.spec_from_file_location(plugin_name, filepath)
+        mtime = os.path.getmtime(filepath)
         
-        if spec is None:
-            raise ImportError(f"Impossibile caricare il plugin da {filepath}")
+        # Riusa il modulo già importato se il file non è cambiato dall'ultimo caricamento
+        cached_mtime, module = self._module_cache.get(filepath, (None, None))
+        if cached_mtime != mtime or sys.modules.get(plugin_name) is not module:
+            spec = importlib.util.spec_from_file_location(plugin_name, filepath)
             
-        module = importlib.util.module_from_spec(spec)
-        sys.modules[plugin_name] = module
-        
-        try:
-            spec.loader.exec_module(module)
-        except Exception as e:
-            raise ImportError(f"Errore durante l'esecuzione del modulo {plugin_name}: {e}")
+            if spec is None:
+                raise ImportError(f"Impossibile caricare il plugin da {filepath}")
+                
+            module = importlib.util.module_from_spec(spec)
+            sys.modules[plugin_name] = module
+            
+            try:
+                spec.loader.exec_module(module)
+            except Exception as e:
+                raise ImportError(f"Errore durante l'esecuzione del modulo {plugin_name}: {e}")
+            
+            self._module_cache[filepath] = (mtime, module)
         
         # Cerca tutte le classi che ereditano da PluginBase
         for name, obj in module.__dict__.items():
-            if (isinstance(obj, type) and 
-                issubclass(obj, PluginBase) and 
-                obj is not PluginBase):
+            if not isinstance(obj, type):
+                continue
+            # Considera solo le classi definite nel file del plugin, non quelle importate
+            if obj.__module__ != plugin_name:
+                continue
+            if obj is not PluginBase and issubclass(obj, PluginBase):
                 
                 try:
                     plugin_instance = obj()
                     plugin_id = plugin_instance.get_id()
                     
-                    if plugin_id in self.plugins:
+                    if plugin_id in plugins:
                         raise ValueError(f"Plugin ID {plugin_id} già esistente")
                     
-                    self.plugins[plugin_id] = plugin_instance
+                    plugins[plugin_id] = plugin_instance
                     print(f"Plugin caricato: {plugin_id}")
                     return
                 
@@ -169,36 +218,39 @@ class PluginManager:
             print(f"Directory plugin creata: {self.plugins_dir}")
             return
         
-        # Svuota le liste di plugin e hook
-        self.plugins = {}
-        self.hooks = {}
+        # Plugin e hook vengono raccolti in nuovi dizionari e sostituiti solo alla fine:
+        # un'analisi in corso durante il ricaricamento (che può girare in un altro thread)
+        # continua a usare l'insieme precedente, completo
+        plugins = {}
+        hooks = {}
         
         # Carica tutti i file Python nella directory plugins
         for filename in os.listdir(self.plugins_dir):
             if filename.endswith('.py') and not filename.startswith('__'):
                 try:
                     filepath = os.path.join(self.plugins_dir, filename)
-                    self._load_plugin_from_file(filepath)
+                    self._load_plugin_from_file(filepath, plugins)
                 except Exception as e:
                     print(f"Errore nel caricamento del plugin {filename}: {e}")
-                    import traceback
                     traceback.print_exc()
         
         # Registra gli hook di tutti i plugin
-        for plugin_id, plugin in self.plugins.items():
-            self._register_plugin_hooks(plugin_id, plugin)
+        for plugin_id, plugin in plugins.items():
+            self._register_plugin_hooks(plugin_id, plugin, hooks)
+        
+        self.plugins = plugins
+        self.hooks = hooks
         
         print(f"=== Caricamento completato: {len(self.plugins)} plugin ===\n")
 
-    def _register_plugin_hooks(self, plugin_id, plugin):
-        """Registra gli hook di un plugin"""
-        hooks = plugin.get_hooks()
-        for hook_name, methods in hooks.items():
-            if hook_name not in self.hooks:
-                self.hooks[hook_name] = []
+    def _register_plugin_hooks(self, plugin_id, plugin, hooks):
+        """Registra gli hook di un plugin nel dizionario hooks"""
+        for hook_name, methods in plugin.get_hooks().items():
+            if hook_name not in hooks:
+                hooks[hook_name] = []
             
             for method in methods:
-                self.hooks[hook_name].append((plugin_id, method))
+                hooks[hook_name].append((plugin_id, method))
     
     def get_plugin_config(self, plugin_id):
         """Ritorna la configurazione di un plugin"""
@@ -213,8 +265,10 @@ class PluginManager:
         """Esegue tutti i gestori registrati per un hook"""
         results = []
         
-        if hook_name in self.hooks:
-            for plugin_id, method in self.hooks[hook_name]:
+        # Legge self.hooks una sola volta: un ricaricamento può sostituirlo nel frattempo
+        hooks = self.hooks
+        if hook_name in hooks:
+            for plugin_id, method in hooks[hook_name]:
                 try:
                     # Controlla se il plugin è abilitato
                     plugin_config = self.get_plugin_config(plugin_id) or {}
@@ -266,7 +320,9 @@ class PHPAnalyzer:
             #self._check_variable_syntax(lines)
             
             # Esegui controlli tramite plugin
-            plugin_errors = self.plugin_manager.call_hook('syntax_check', filepath=filepath, lines=lines)
+            # Stato HTML/commenti/stringhe calcolato una volta e condiviso tra i plugin
+            php_state = PhpFileState(lines)
+            plugin_errors = self.plugin_manager.call_hook('syntax_check', filepath=filepath, lines=lines, php_state=php_state)
             for error_list in plugin_errors:
                 self.errors.extend(error_list)
             
@@ -388,73 +444,7 @@ class PHPAnalyzer:
     
     def _remove_strings_and_comments(self, text):
         """Rimuove stringhe e commenti dal testo per evitare falsi positivi"""
-        result = []
-        i = 0
-        in_single_quote = False
-        in_double_quote = False
-        in_single_comment = False
-        in_multi_comment = False
-        
-        while i < len(text):
-            char = text[i]
-            
-            # Gestione commenti multi-linea
-            if not in_single_quote and not in_double_quote:
-                if not in_multi_comment and text[i:i+2] == '/*':
-                    in_multi_comment = True
-                    result.append('  ')  # Sostituisci con spazi per mantenere la posizione
-                    i += 2
-                    continue
-                elif in_multi_comment and text[i:i+2] == '*/':
-                    in_multi_comment = False
-                    result.append('  ')
-                    i += 2
-                    continue
-                elif in_multi_comment:
-                    result.append(' ' if char != '\n' else '\n')
-                    i += 1
-                    continue
-                
-                # Gestione commenti single-line
-                if not in_single_comment and text[i:i+2] == '//':
-                    in_single_comment = True
-                    result.append('  ')
-                    i += 2
-                    continue
-                elif in_single_comment and char == '\n':
-                    in_single_comment = False
-                    result.append('\n')
-                    i += 1
-                    continue
-                elif in_single_comment:
-                    result.append(' ')
-                    i += 1
-                    continue
-            
-            # Gestione stringhe
-            if not in_single_comment and not in_multi_comment:
-                # Verifica escape
-                if i > 0 and text[i-1] == '\\':
-                    result.append(' ')
-                    i += 1
-                    continue
-                
-                if char == "'" and not in_double_quote:
-                    in_single_quote = not in_single_quote
-                    result.append(' ')
-                elif char == '"' and not in_single_quote:
-                    in_double_quote = not in_double_quote
-                    result.append(' ')
-                elif in_single_quote or in_double_quote:
-                    result.append(' ' if char != '\n' else '\n')
-                else:
-                    result.append(char)
-            else:
-                result.append(' ' if char != '\n' else '\n')
-            
-            i += 1
-        
-        return ''.join(result)
+        return _STRINGS_AND_COMMENTS_RE.sub(_blank, text)
     
     def _check_semicolons(self, lines: List[str]):
         """Controlla i punti e virgola mancanti"""
@@ -796,6 +786,7 @@ class PHPAnalyzer:
         
 class PHPAnalyzerGUI:
     def __init__(self, root):
+        _import_tk()
         self.root = root
         self.root.title("PHP Syntax Analyzer")
         self.root.geometry("900x700")
@@ -843,6 +834,8 @@ class PHPAnalyzerGUI:
         # Frame per i controlli file/directory
         control_frame = ttk.Frame(main_frame)
         control_frame.grid(row=0, column=0, sticky=(tk.W, tk.E), pady=(0, 10))
+        # Riferimento esposto ai plugin che aggiungono pulsanti alla barra degli strumenti
+        self.toolbar_frame = control_frame
         
         # Nella funzione create_widgets, aggiungi questo pulsante al control_frame
         ttk.Button(control_frame, text="Gestione Plugin", command=self.show_plugin_manager).grid(row=0, column=6, padx=5)
@@ -989,21 +982,7 @@ class PHPAnalyzerGUI:
         
     def run_analysis(self):
         try:
-            files_to_analyze = []
-            
-            if os.path.isfile(self.current_file):
-                if self.current_file.endswith('.php'):
-                    files_to_analyze.append(self.current_file)
-            elif os.path.isdir(self.current_file):
-                if self.recursive_var.get():
-                    for root, dirs, files in os.walk(self.current_file):
-                        for file in files:
-                            if file.endswith('.php'):
-                                files_to_analyze.append(os.path.join(root, file))
-                else:
-                    for file in os.listdir(self.current_file):
-                        if file.endswith('.php'):
-                            files_to_analyze.append(os.path.join(self.current_file, file))
+            files_to_analyze = list(_iter_php_files(self.current_file, self.recursive_var.get()))
             
             if not files_to_analyze:
                 self.root.after(0, lambda: messagebox.showinfo("Info", "Nessun file PHP trovato"))
@@ -1115,10 +1094,113 @@ class PHPAnalyzerGUI:
         self.current_errors = []
         pass
         
+def _iter_php_files(path: str, recursive: bool = False):
+    """Restituisce i file PHP contenuti in un file o in una directory"""
+    if os.path.isfile(path):
+        if path.endswith('.php'):
+            yield path
+    elif os.path.isdir(path):
+        if recursive:
+            for root, dirs, files in os.walk(path):
+                for file in files:
+                    if file.endswith('.php'):
+                        yield os.path.join(root, file)
+        else:
+            for file in os.listdir(path):
+                if file.endswith('.php'):
+                    yield os.path.join(path, file)
+
+def print_errors(filepath: str, errors: List[SyntaxError]):
+    """Stampa sulla console gli errori trovati in un file"""
+    if not errors:
+        print(f"✓ Nessun errore trovato in: {filepath}")
+        return
+    
+    print(f"{'='*80}\nFile: {filepath}\n{'='*80}")
+    for error in errors:
+        print(f"Riga {error.line_number}: {error.error_type} [{error.category}]")
+        print(f"   Codice: {error.line_content}")
+        print(f"   Problema: {error.description}")
+        print(f"   Suggerimento: {error.suggestion}")
+    print()
+
+# Numero minimo di file per cui conviene distribuire l'analisi su più processi
+PARALLEL_MIN_FILES = 8
+
+# Analizzatore del processo worker, creato una sola volta dall'initializer del pool
+_worker_analyzer = None
+
+def _init_worker():
+    """Carica i plugin una sola volta per ogni processo worker"""
+    global _worker_analyzer
+    # Con l'avvio 'spawn' questo modulo non si chiama 'analizzatore': vedi il blocco __main__
+    sys.modules.setdefault('analizzatore', sys.modules[__name__])
+    # Il caricamento dei plugin stampa diagnostica: evita di ripeterla per ogni worker
+    with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+        _worker_analyzer = PHPAnalyzer()
+
+def _analyze_in_worker(filepath: str) -> Tuple[str, List[SyntaxError]]:
+    """Analizza un file nel processo worker"""
+    # I messaggi dei plugin vanno su stderr, separati dai risultati
+    with contextlib.redirect_stdout(sys.stderr):
+        return filepath, _worker_analyzer.analyze_file(filepath)
+
+def analyze_files(filepaths: List[str]):
+    """
+    Analizza una lista di file restituendo le coppie (file, errori) nello stesso ordine.
+    Oltre PARALLEL_MIN_FILES file l'analisi viene distribuita su più processi
+    """
+    if len(filepaths) < PARALLEL_MIN_FILES or (os.cpu_count() or 1) < 2:
+        # Come nei worker, la diagnostica dei plugin va su stderr e non tra i risultati
+        with contextlib.redirect_stdout(sys.stderr):
+            analyzer = PHPAnalyzer()
+        for filepath in filepaths:
+            with contextlib.redirect_stdout(sys.stderr):
+                errors = analyzer.analyze_file(filepath)
+            yield filepath, errors
+        return
+    
+    with ProcessPoolExecutor(initializer=_init_worker) as executor:
+        yield from executor.map(_analyze_in_worker, filepaths, chunksize=8)
+
+def analyze_cli(path: str, recursive: bool = False) -> int:
+    """
+    Analizza file o directory senza interfaccia grafica. Ritorna il codice di uscita:
+    0 senza errori, 1 se sono stati trovati errori, 2 se non c'è nessun file PHP da analizzare
+    """
+    if not os.path.exists(path):
+        print(f"Percorso non trovato: {path}", file=sys.stderr)
+        return 2
+    
+    filepaths = list(_iter_php_files(path, recursive))
+    if not filepaths:
+        print(f"Nessun file PHP trovato in: {path}", file=sys.stderr)
+        return 2
+    
+    total_errors = 0
+    for filepath, errors in analyze_files(filepaths):
+        total_errors += len(errors)
+        print_errors(filepath, errors)
+    
+    return 1 if total_errors else 0
+
 def main():
+    _import_tk()
     root = tk.Tk()
     app = PHPAnalyzerGUI(root)
     root.mainloop()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # I plugin importano PluginBase da 'analizzatore': registra questo modulo con
+    # quel nome, altrimenti esisterebbero due classi PluginBase distinte
+    sys.modules.setdefault('analizzatore', sys.modules[__name__])
+    
+    if '--cli' in sys.argv:
+        # Uso: analizzatore.py --cli <file o directory> [-r]
+        args = [arg for arg in sys.argv[1:] if arg not in ('--cli', '-r')]
+        if not args:
+            print("Uso: analizzatore.py --cli <file o directory> [-r]", file=sys.stderr)
+            sys.exit(2)
+        sys.exit(analyze_cli(args[0], recursive='-r' in sys.argv))
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Stato di un file PHP e utilità condivise tra l'analizzatore e i plugin
+"""
+import fnmatch
+import functools
+import os
+import re
+from itertools import accumulate
+from typing import List, Tuple
+
+# Caratteri che cambiano lo stato stringa: backslash e virgolette
+_STRING_SPECIAL_RE = re.compile(r'[\\\'"]')
+
+def _build_string_mask(line: str) -> bytes:
+    """
+    Calcola in un solo passaggio lo stato stringa di ogni colonna della linea:
+    mask[pos] vale 1 se la posizione pos è all'interno di una stringa
+    """
+    if '"' not in line and "'" not in line:
+        return bytes(len(line) + 1)
+    
+    mask = bytearray(len(line) + 1)
+    string_char = None
+    string_start = 0
+    escaped_pos = -1
+    
+    # Visita solo virgolette e backslash: le colonne intermedie vengono riempite a blocchi
+    for match in _STRING_SPECIAL_RE.finditer(line):
+        pos = match.start()
+        if pos == escaped_pos:
+            continue
+        char = line[pos]
+        if char == '\\':
+            escaped_pos = pos + 1
+        elif string_char is None:
+            string_char = char
+            string_start = pos + 1
+        elif char == string_char:
+            mask[string_start:pos + 1] = b'\x01' * (pos + 1 - string_start)
+            string_char = None
+    
+    # Stringa non chiusa: si estende fino alla fine della linea
+    if string_char is not None:
+        mask[string_start:] = b'\x01' * (len(mask) - string_start)
+    
+    return bytes(mask)
+
+class PhpFileState:
+    """
+    Stato di un file PHP calcolato una sola volta e condiviso tra i plugin.
+    PHPAnalyzer lo passa agli hook syntax_check come argomento php_state
+    """
+    __slots__ = ('lines', 'in_html', 'in_multi_comment', '_string_masks', '_text', '_line_starts')
+    
+    def __init__(self, lines: List[str]):
+        self.lines = lines
+        # in_html[i]: la linea i (base 0) segue un '?>' non riaperto
+        self.in_html = [False] * len(lines)
+        # in_multi_comment[i]: stato del commento /* */ dopo la linea i
+        self.in_multi_comment = [False] * len(lines)
+        self._string_masks = {}
+        self._text = None
+        self._line_starts = None
+        
+        in_php = True
+        in_multi = False
+        for idx, line in enumerate(lines):
+            # Lo stato HTML dipende solo dalle linee precedenti
+            self.in_html[idx] = not in_php
+            if '<?' in line:
+                in_php = True
+            elif '?>' in line:
+                in_php = False
+            
+            # Lo stato del commento multi-linea include la linea corrente
+            if '/*' in line:
+                in_multi = True
+            if '*/' in line:
+                in_multi = False
+            self.in_multi_comment[idx] = in_multi
+    
+    @property
+    def text(self) -> str:
+        """Il file come unica stringa (''.join delle linee), costruita alla prima richiesta"""
+        if self._text is None:
+            self._text = ''.join(self.lines)
+        return self._text
+    
+    @property
+    def line_starts(self) -> List[int]:
+        """Offset in text dell'inizio di ogni linea, più la lunghezza totale in fondo"""
+        if self._line_starts is None:
+            self._line_starts = list(accumulate(map(len, self.lines), initial=0))
+        return self._line_starts
+    
+    def string_mask(self, index: int) -> bytes:
+        """Maschera stringa della linea index (base 0), calcolata alla prima richiesta"""
+        mask = self._string_masks.get(index)
+        if mask is None:
+            mask = self._string_masks[index] = _build_string_mask(self.lines[index])
+        return mask
+    
+    def is_in_string(self, index: int, pos: int) -> bool:
+        """Verifica se la posizione pos della linea index (base 0) è all'interno di una stringa"""
+        # Senza virgolette prima di pos non si può essere in una stringa: evita la maschera
+        line = self.lines[index]
+        if line.find('"', 0, pos) == -1 and line.find("'", 0, pos) == -1:
+            return False
+        return bool(self.string_mask(index)[pos])
+    
+    def comment_pos(self, index: int) -> int:
+        """Posizione del primo // fuori da una stringa nella linea index (base 0), oppure -1"""
+        line = self.lines[index]
+        pos = line.find('//')
+        while pos != -1 and self.is_in_string(index, pos):
+            pos = line.find('//', pos + 1)
+        return pos
+    
+    def is_comment_only(self, index: int) -> bool:
+        """Verifica se la linea index (base 0) è vuota o contiene solo un commento // o # (ma non un attributo #[...])"""
+        lstripped = self.lines[index].lstrip()
+        return not lstripped or lstripped.startswith(('//', '#')) and not lstripped.startswith('#[')
+
+@functools.lru_cache(maxsize=32)
+def _compile_globs(patterns: Tuple[str, ...]):
+    """Stessa normalizzazione di fnmatch.fnmatch, ma una sola regex per tutti i pattern"""
+    return re.compile('|'.join(fnmatch.translate(os.path.normcase(pattern)) for pattern in patterns))
+
+@functools.lru_cache(maxsize=16384)
+def matches_globs(filepath: str, patterns: Tuple[str, ...]) -> bool:
+    """
+    Verifica se il percorso corrisponde ad almeno uno dei pattern glob, come fnmatch.fnmatch.
+    L'esito è memorizzato per percorso e insieme di pattern: le analisi ripetute non rifanno il confronto
+    """
+    if not patterns:
+        return False
+    return bool(_compile_globs(patterns).match(os.path.normcase(filepath)))
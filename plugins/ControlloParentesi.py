@@ -3,24 +3,26 @@
 Plugin per il controllo delle parentesi per PHP Analyzer
 Controlla la corretta apertura e chiusura di parentesi, graffe e quadre
 """
+import os
 import re
+import sys
 from typing import List, Dict, Tuple, Any
 
 try:
     # Tentativo di import diretto
-    from analizzatore import PluginBase, SyntaxError
+    from analizzatore import PluginBase, SyntaxError, matches_globs
 except ImportError:
     try:
         # Tentativo di import relativo
         import sys
         import os
         sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        from analizzatore import PluginBase, SyntaxError
+        from analizzatore import PluginBase, SyntaxError, matches_globs
     except ImportError:
         # Definizione di fallback per IDE e debugging
         from dataclasses import dataclass
         
-        @dataclass
+        @dataclass(slots=True)
         class SyntaxError:
             line_number: int
             line_content: str
@@ -37,6 +39,128 @@ except ImportError:
             def get_hooks(self): pass
             def get_dependencies(self): pass
             def get_config_defaults(self): pass
+        
+        from phpstate import matches_globs
+
+# Stringhe e commenti PHP; quelli non chiusi si estendono fino alla fine del file
+_STRINGS_AND_COMMENTS_PATTERN = (
+    r"/\*.*?(?:\*/|\Z)"                    # commento multi-linea
+    r"|//[^\n]*"                            # commento single-line
+    r"|\"(?:\\.|[^\"\\])*(?:\"|\\?\Z)"      # stringa tra virgolette doppie
+    r"|'(?:\\.|[^'\\])*(?:'|\\?\Z)"          # stringa tra virgolette singole
+)
+# Token rilevanti per il controllo: stringhe e commenti (da saltare), parentesi e a capo
+_BRACKET_TOKENS_RE = re.compile(
+    _STRINGS_AND_COMMENTS_PATTERN + r"|(?P<bracket>[(){}\[\]])|(?P<newline>\n)",
+    re.DOTALL
+)
+
+# Come sopra, ma salta anche l'HTML tra '?>' e il tag di apertura successivo: le parentesi
+# vengono controllate solo nelle isole PHP, con un'unica pila che attraversa i tag
+# (ad esempio '<?php if ($x) { ?> ... <?php } ?>'); il commento single-line termina a '?>'
+_PHP_BRACKET_TOKENS_RE = re.compile(
+    r"/\*.*?(?:\*/|\Z)"                    # commento multi-linea
+    r"|//(?:[^\n?]|\?(?!>))*"                # commento single-line
+    r"|\"(?:\\.|[^\"\\])*(?:\"|\\?\Z)"      # stringa tra virgolette doppie
+    r"|'(?:\\.|[^'\\])*(?:'|\\?\Z)"          # stringa tra virgolette singole
+    r"|\?>.*?(?:<\?(?:php|=)?|\Z)"           # HTML fino al tag di apertura successivo
+    r"|(?P<bracket>[(){}\[\]])|(?P<newline>\n)",
+    re.DOTALL
+)
+_PHP_OPEN_TAG_RE = re.compile(r"<\?(?:php|=)?")
+
+# Coppie di parentesi e relative mappe di lookup
+_BRACKETS = {'(': ')', '{': '}', '[': ']'}
+_OPENERS = frozenset(_BRACKETS)
+_CLOSE_TO_OPEN = {close: open_ for open_, close in _BRACKETS.items()}
+
+# Tipi di evento prodotti da _scan_brackets
+_CHIUSA_SENZA_APERTURA = 0
+_NON_CORRISPONDENTE = 1
+_NON_CHIUSA = 2
+
+_ERR_NIDIFICAZIONE = sys.intern("Nidificazione eccessiva")
+
+# Messaggi per tipo di evento: (tipo errore, descrizione, suggerimento), formattati
+# solo per gli errori effettivamente riportati; i tipi errore sono internati
+_EVENT_MESSAGES = {
+    _CHIUSA_SENZA_APERTURA: (
+        sys.intern("Parentesi chiusa senza apertura"),
+        "Trovata '{found}' senza corrispondente apertura",
+        "Verifica se manca una '{expected}' prima",
+    ),
+    _NON_CORRISPONDENTE: (
+        sys.intern("Parentesi non corrispondente"),
+        "Atteso '{expected}' ma trovato '{found}'",
+        "Sostituisci '{found}' con '{expected}'",
+    ),
+    _NON_CHIUSA: (
+        sys.intern("Parentesi non chiusa"),
+        "'{found}' aperta ma mai chiusa",
+        "Aggiungi '{expected}' alla fine del blocco",
+    ),
+}
+
+def _scan_brackets(code: str, tokens_re=_BRACKET_TOKENS_RE, pos: int = 0) -> Tuple[List[Tuple[int, int, Any]], int]:
+    """
+    Esegue il matching delle parentesi in un solo passaggio sul codice sorgente.
+    Stringhe e commenti vengono saltati direttamente dal tokenizer, senza costruire
+    una copia ripulita del file; il ciclo Python gira solo su parentesi e a capo.
+    
+    Args:
+        code: Il codice sorgente
+        tokens_re: Il tokenizer (_BRACKET_TOKENS_RE o _PHP_BRACKET_TOKENS_RE)
+        pos: La posizione da cui iniziare la scansione
+    
+    Returns:
+        (eventi, nidificazione massima); ogni evento è (tipo, riga, dati) dove i dati
+        sono il carattere di chiusura, la coppia (apertura, chiusura) o il carattere di apertura
+    """
+    # Pila come liste parallele (carattere, riga) per non allocare una tupla per push;
+    # la colonna non viene mai riportata negli errori e quindi non viene tracciata
+    stack_chars = []
+    stack_lines = []
+    events = []
+    brackets = _BRACKETS
+    openers = _OPENERS
+    
+    line_number = code.count('\n', 0, pos) + 1
+    max_nesting = 0
+    current_nesting = 0
+    
+    for match in tokens_re.finditer(code, pos):
+        kind = match.lastgroup
+        
+        if kind == 'newline':
+            line_number += 1
+            continue
+        
+        if kind is None:
+            # Stringa o commento: conta solo gli a capo che contiene
+            line_number += code.count('\n', match.start(), match.end())
+            continue
+        
+        char = match.group()
+        if char in openers:
+            stack_chars.append(char)
+            stack_lines.append(line_number)
+            current_nesting += 1
+            if current_nesting > max_nesting:
+                max_nesting = current_nesting
+        elif not stack_chars:
+            events.append((_CHIUSA_SENZA_APERTURA, line_number, char))
+        else:
+            opening = stack_chars.pop()
+            stack_lines.pop()
+            current_nesting -= 1
+            if brackets[opening] != char:
+                events.append((_NON_CORRISPONDENTE, line_number, (opening, char)))
+    
+    # Parentesi non chiuse, dalla più interna
+    while stack_chars:
+        events.append((_NON_CHIUSA, stack_lines.pop(), stack_chars.pop()))
+    
+    return events, max_nesting
 
 class ParentesiSyntaxChecker(PluginBase):
     """
@@ -106,63 +230,51 @@ class ParentesiSyntaxChecker(PluginBase):
         if self._should_ignore_file(filepath, config):
             return errors
         
-        # Prima uniamo tutte le linee per avere una visione completa del codice
-        full_code = '\n'.join(lines)
+        # Uniamo tutte le linee (che mantengono già l'a capo) per avere una visione completa del codice;
+        # se l'analizzatore passa lo stato del file, il testo unito è già condiviso tra i plugin
+        php_state = kwargs.get('php_state')
+        full_code = php_state.text if php_state is not None else ''.join(lines)
         
-        # Rimuoviamo stringhe e commenti per evitare falsi positivi
-        cleaned_code = self._remove_strings_and_comments(full_code)
+        # Nessuna parentesi nel file: non c'è nulla da controllare
+        if not any(char in full_code for char in '(){}[]'):
+            return errors
         
-        # Ora controlliamo i bracket nel codice pulito
-        stack = []
-        brackets = {'(': ')', '{': '}', '[': ']'}
+        # Controlliamo i bracket saltando stringhe e commenti per evitare falsi positivi;
+        # senza check_in_html l'HTML fuori dai tag PHP viene saltato allo stesso modo
+        if config.get("check_in_html", False):
+            events, max_nesting = _scan_brackets(full_code)
+        else:
+            open_tag = _PHP_OPEN_TAG_RE.search(full_code)
+            if open_tag is None:
+                # Solo HTML: nessun codice PHP da controllare
+                return errors
+            events, max_nesting = _scan_brackets(full_code, _PHP_BRACKET_TOKENS_RE, open_tag.end())
         
-        line_number = 1
-        column = 0
-        max_nesting = 0
-        current_nesting = 0
+        # Contenuto ripulito delle linee già riportate: più errori sulla stessa linea
+        # (tipico di un file malformato) la ripuliscono una volta sola
+        stripped_lines = {}
         
-        for i, char in enumerate(cleaned_code):
-            if char == '\n':
-                line_number += 1
-                column = 0
-                continue
+        for kind, line_number, data in events:
+            if kind == _CHIUSA_SENZA_APERTURA:
+                found, expected = data, _CLOSE_TO_OPEN[data]
+            elif kind == _NON_CORRISPONDENTE:
+                opening, found = data
+                expected = _BRACKETS[opening]
+            else:
+                found, expected = data, _BRACKETS[data]
             
-            column += 1
+            line_content = stripped_lines.get(line_number)
+            if line_content is None:
+                line_content = lines[line_number-1].strip() if line_number <= len(lines) else ""
+                stripped_lines[line_number] = line_content
             
-            if char in brackets.keys():
-                stack.append((char, line_number, column))
-                current_nesting += 1
-                max_nesting = max(max_nesting, current_nesting)
-            elif char in brackets.values():
-                if not stack:
-                    errors.append(SyntaxError(
-                        line_number, 
-                        lines[line_number-1].strip() if line_number <= len(lines) else "", 
-                        "Parentesi chiusa senza apertura",
-                        f"Trovata '{char}' senza corrispondente apertura",
-                        f"Verifica se manca una '{list(brackets.keys())[list(brackets.values()).index(char)]}' prima"
-                    ))
-                else:
-                    opening, open_line, open_col = stack.pop()
-                    current_nesting -= 1
-                    if brackets[opening] != char:
-                        errors.append(SyntaxError(
-                            line_number, 
-                            lines[line_number-1].strip() if line_number <= len(lines) else "", 
-                            "Parentesi non corrispondente",
-                            f"Atteso '{brackets[opening]}' ma trovato '{char}'",
-                            f"Sostituisci '{char}' con '{brackets[opening]}'"
-                        ))
-        
-        # Controlla parentesi non chiuse
-        while stack:
-            opening, line_num, col = stack.pop()
+            error_type, description, suggestion = _EVENT_MESSAGES[kind]
             errors.append(SyntaxError(
-                line_num, 
-                lines[line_num-1].strip() if line_num <= len(lines) else "", 
-                "Parentesi non chiusa",
-                f"'{opening}' aperta ma mai chiusa",
-                f"Aggiungi '{brackets[opening]}' alla fine del blocco"
+                line_number, 
+                line_content, 
+                error_type,
+                description.format(found=found, expected=expected),
+                suggestion.format(found=found, expected=expected)
             ))
         
         # Controlla nidificazione eccessiva
@@ -171,7 +283,7 @@ class ParentesiSyntaxChecker(PluginBase):
             errors.append(SyntaxError(
                 1,  # Mettiamo come prima riga per semplicità
                 "Intero file",
-                "Nidificazione eccessiva",
+                _ERR_NIDIFICAZIONE,
                 f"La profondità massima di nidificazione ({max_nesting}) supera il limite consentito ({max_nesting_allowed})",
                 "Considera di ristrutturare il codice per ridurre la nidificazione"
             ))
@@ -180,80 +292,4 @@ class ParentesiSyntaxChecker(PluginBase):
     
     def _should_ignore_file(self, filepath: str, config: Dict) -> bool:
         """Verifica se il file deve essere ignorato in base ai pattern"""
-        import fnmatch
-        
-        ignore_patterns = config.get("ignore_patterns", [])
-        for pattern in ignore_patterns:
-            if fnmatch.fnmatch(filepath, pattern):
-                return True
-        return False
-    
-    def _remove_strings_and_comments(self, text: str) -> str:
-        """Rimuove stringhe e commenti dal testo per evitare falsi positivi"""
-        result = []
-        i = 0
-        in_single_quote = False
-        in_double_quote = False
-        in_single_comment = False
-        in_multi_comment = False
-        
-        while i < len(text):
-            char = text[i]
-            
-            # Gestione commenti multi-linea
-            if not in_single_quote and not in_double_quote:
-                if not in_multi_comment and i + 1 < len(text) and text[i:i+2] == '/*':
-                    in_multi_comment = True
-                    result.append('  ')  # Sostituisci con spazi per mantenere la posizione
-                    i += 2
-                    continue
-                elif in_multi_comment and i + 1 < len(text) and text[i:i+2] == '*/':
-                    in_multi_comment = False
-                    result.append('  ')
-                    i += 2
-                    continue
-                elif in_multi_comment:
-                    result.append(' ' if char != '\n' else '\n')
-                    i += 1
-                    continue
-                
-                # Gestione commenti single-line
-                if not in_single_comment and i + 1 < len(text) and text[i:i+2] == '//':
-                    in_single_comment = True
-                    result.append('  ')
-                    i += 2
-                    continue
-                elif in_single_comment and char == '\n':
-                    in_single_comment = False
-                    result.append('\n')
-                    i += 1
-                    continue
-                elif in_single_comment:
-                    result.append(' ')
-                    i += 1
-                    continue
-            
-            # Gestione stringhe
-            if not in_single_comment and not in_multi_comment:
-                # Verifica escape
-                if i > 0 and text[i-1] == '\\':
-                    result.append(' ')
-                    i += 1
-                    continue
-                
-                if char == "'" and not in_double_quote:
-                    in_single_quote = not in_single_quote
-                    result.append(' ')
-                elif char == '"' and not in_single_quote:
-                    in_double_quote = not in_double_quote
-                    result.append(' ')
-                elif in_single_quote or in_double_quote:
-                    result.append(' ' if char != '\n' else '\n')
-                else:
-                    result.append(char)
-            else:
-                result.append(' ' if char != '\n' else '\n')
-            
-            i += 1
-        
-        return ''.join(result)
\ No newline at end of file
+        return matches_globs(filepath, tuple(config.get("ignore_patterns", [])))
@@ -2,11 +2,13 @@
 """
 Plugin per il controllo dei punti e virgola in PHP
 """
-from typing import List, Tuple
+from typing import List
+import os
 import re
+import sys
 
 try:
-    from analizzatore import PluginBase, SyntaxError
+    from analizzatore import PluginBase, SyntaxError, PhpFileState
 except ImportError:
     # Definizione di fallback per IDE
     class PluginBase:
@@ -14,12 +16,70 @@ except ImportError:
         def get_hooks(self): pass
     
     class SyntaxError:
+        __slots__ = ('line_number', 'line_content', 'error_type', 'description', 'suggestion')
+        
         def __init__(self, line_number, line_content, error_type, description, suggestion):
             self.line_number = line_number
             self.line_content = line_content
             self.error_type = error_type
             self.description = description
             self.suggestion = suggestion
+    
+    # Lo stato condiviso non dipende dall'interfaccia: lo si importa dal modulo comune
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from phpstate import PhpFileState
+
+# Istruzioni PHP che devono terminare con ; (compilate una sola volta)
+_STATEMENT_PATTERNS = [
+    (re.compile(r'^\$\w+.*=(?!=)(?!.*\[$)'), 'assegnazione variabile'),  # Escludi array e confronti
+    (re.compile(r'^echo\s+(?!.*[\'"]\s*$)'), 'echo'),  # Escludi echo che aprono stringhe multilinea
+    (re.compile(r'^print\s+(?!.*[\'"]\s*$)'), 'print'),
+    (re.compile(r'^return\s+'), 'return'),
+    (re.compile(r'^return$'), 'return vuoto'),
+    (re.compile(r'^include\s+'), 'include'),
+    (re.compile(r'^include_once\s+'), 'include_once'),
+    (re.compile(r'^require\s+'), 'require'),
+    (re.compile(r'^require_once\s+'), 'require_once'),
+    (re.compile(r'^die\s*\('), 'die'),
+    (re.compile(r'^exit\s*\('), 'exit'),
+    (re.compile(r'^throw\s+'), 'throw'),
+    (re.compile(r'^break$'), 'break'),
+    (re.compile(r'^continue$'), 'continue'),
+    (re.compile(r'^\w+\s*\(.*\)\s*$'), 'chiamata funzione'),
+    (re.compile(r'^unset\s*\('), 'unset'),
+    (re.compile(r'^isset\s*\('), 'isset'),
+    (re.compile(r'^empty\s*\('), 'empty'),
+    (re.compile(r'^list\s*\('), 'list'),
+]
+
+# Dichiarazioni di funzione
+_FUNCTION_DEF_RE = re.compile(r'^\s*(public|private|protected|static)?\s*function\s+\w+\s*\(')
+
+# Pattern per riconoscere l'inizio di stringhe multi-riga
+_MULTILINE_START_PATTERNS = [
+    # $var = $obj->method("
+    (re.compile(r'^\$\w+\s*=\s*\$\w+\s*->\s*\w+\s*\(\s*"$'), '"'),
+    (re.compile(r'^\$\w+\s*=\s*\$\w+\s*->\s*\w+\s*\(\s*\'$'), "'"),
+    # $var = function("
+    (re.compile(r'^\$\w+\s*=\s*\w+\s*\(\s*"$'), '"'),
+    (re.compile(r'^\$\w+\s*=\s*\w+\s*\(\s*\'$'), "'"),
+    # Varianti con spazi
+    (re.compile(r'^\$\w+\s*=\s*\$\w+\s*->\s*\w+\s*\(\s*"\s*$'), '"'),
+    (re.compile(r'^\$\w+\s*=\s*\$\w+\s*->\s*\w+\s*\(\s*\'\s*$'), "'"),
+]
+
+# Prefissi delle strutture di controllo, per un unico str.startswith
+_CONTROL_PREFIXES = tuple(
+    prefix
+    for cs in ('if', 'else', 'elseif', 'for', 'foreach', 'while', 'switch', 'catch', 'finally')
+    for prefix in (f"{cs}(", f"{cs} (")
+)
+
+# Parole chiave delle dichiarazioni strutturali
+_STRUCTURAL_KEYWORDS = ('namespace', 'class', 'interface', 'trait', 'extends', 'implements')
+
+# Tipo errore internato, condiviso da tutti gli errori del plugin
+_ERR_PUNTO_E_VIRGOLA = sys.intern("Punto e virgola mancante")
 
 class SemicolonChecker(PluginBase):
     """
@@ -46,60 +106,6 @@ class SemicolonChecker(PluginBase):
             'syntax_check': [self.check_semicolons]
         }
     
-    def _is_in_html_block(self, lines: List[str], line_num: int) -> bool:
-        """Verifica se una linea è all'interno di un blocco HTML (dopo ?>)"""
-        in_php = True
-        for i in range(line_num):
-            if '<?php' in lines[i] or '<?' in lines[i]:
-                in_php = True
-            elif '?>' in lines[i]:
-                in_php = False
-        return not in_php
-    
-    def _is_in_comment(self, lines: List[str], line_num: int) -> Tuple[bool, bool]:
-        """Verifica se una linea è in un commento. Ritorna (in_single_comment, in_multi_comment)"""
-        line = lines[line_num - 1]
-        
-        # Commento single-line
-        if '//' in line:
-            comment_pos = line.find('//')
-            # Verifica se // è dentro una stringa
-            if not self._is_in_string(line, comment_pos):
-                return True, False
-                
-        # Verifica commenti multi-line
-        in_multi = False
-        for i in range(line_num):
-            if '/*' in lines[i]:
-                in_multi = True
-            if '*/' in lines[i]:
-                in_multi = False
-                
-        return False, in_multi
-    
-    def _is_in_string(self, line: str, pos: int) -> bool:
-        """Verifica se una posizione è all'interno di una stringa"""
-        in_single = False
-        in_double = False
-        escaped = False
-        
-        for i in range(pos):
-            char = line[i]
-            if escaped:
-                escaped = False
-                continue
-                
-            if char == '\\':
-                escaped = True
-                continue
-                
-            if char == "'" and not in_double:
-                in_single = not in_single
-            elif char == '"' and not in_single:
-                in_double = not in_double
-                
-        return in_single or in_double
-
     def check_semicolons(self, filepath: str, lines: List[str], plugin_config=None, **kwargs) -> List[SyntaxError]:
         """Controlla i punti e virgola mancanti - versione migliorata per stringhe multi-riga"""
         errors = []
@@ -107,22 +113,34 @@ class SemicolonChecker(PluginBase):
         multiline_string_char = None
         multiline_start_line = 0
         
+        # File senza alcun tag di apertura PHP: è solo HTML, non c'è codice da controllare
+        if not any('<?' in line for line in lines):
+            return errors
+        
+        # Stato HTML/commenti condiviso dall'analizzatore, oppure calcolato qui
+        state = kwargs.get('php_state') or PhpFileState(lines)
+        in_html, in_multi = state.in_html, state.in_multi_comment
+        
         for i, line in enumerate(lines, 1):
+            # Salta subito le linee vuote e quelle con solo un commento, ma non dentro una
+            # stringa multi-riga, dove una linea come #foo"); chiude la stringa
+            if not in_multiline_string and state.is_comment_only(i - 1):
+                continue
+                
             # Se siamo in un blocco HTML, salta
-            if self._is_in_html_block(lines, i - 1):
+            if in_html[i - 1]:
                 continue
                 
             # Controlla se siamo in un commento
-            in_single_comment, in_multi_comment = self._is_in_comment(lines, i)
-            if in_multi_comment:
+            comment_pos = state.comment_pos(i - 1)
+            if comment_pos == -1 and in_multi[i - 1]:
                 continue
                 
-            stripped = line.strip()
-            
             # Se è un commento single-line, prendi solo la parte prima del commento
-            if in_single_comment and '//' in line:
-                comment_pos = line.find('//')
+            if comment_pos != -1:
                 stripped = line[:comment_pos].strip()
+            else:
+                stripped = line.strip()
                 
             # Ignora linee vuote
             if not stripped:
@@ -160,9 +178,7 @@ class SemicolonChecker(PluginBase):
                 continue
                 
             # Ignora dichiarazioni strutturali
-            if any(keyword in stripped for keyword in [
-                'namespace', 'class', 'interface', 'trait', 'extends', 'implements'
-            ]) and not stripped.endswith(';'):
+            if any(keyword in stripped for keyword in _STRUCTURAL_KEYWORDS) and not stripped.endswith(';'):
                 continue
             
             # Ignora linee che aprono blocchi (inclusi array e chiamate di funzione multilinea)
@@ -174,49 +190,25 @@ class SemicolonChecker(PluginBase):
                 continue
             
             # Ignora strutture di controllo
-            control_structures = ['if', 'else', 'elseif', 'for', 'foreach', 'while', 'switch', 'catch', 'finally']
-            if any(stripped.startswith(f"{cs}(") or stripped.startswith(f"{cs} (") for cs in control_structures):
+            if stripped.startswith(_CONTROL_PREFIXES):
                 continue
             
             # Ignora dichiarazioni di funzione
-            if re.match(r'^\s*(public|private|protected|static)?\s*function\s+\w+\s*\(', stripped):
+            if _FUNCTION_DEF_RE.match(stripped):
                 continue
             
             # Verifica se la linea necessita di punto e virgola
             needs_semicolon = False
             
-            # Istruzioni PHP che devono terminare con ;
-            statements = [
-                (r'^\$\w+.*=(?!=)(?!.*\[$)', 'assegnazione variabile'),  # Escludi array e confronti
-                (r'^echo\s+(?!.*[\'"]\s*$)', 'echo'),  # Escludi echo che aprono stringhe multilinea
-                (r'^print\s+(?!.*[\'"]\s*$)', 'print'),
-                (r'^return\s+', 'return'),
-                (r'^return$', 'return vuoto'),
-                (r'^include\s+', 'include'),
-                (r'^include_once\s+', 'include_once'),
-                (r'^require\s+', 'require'),
-                (r'^require_once\s+', 'require_once'),
-                (r'^die\s*\(', 'die'),
-                (r'^exit\s*\(', 'exit'),
-                (r'^throw\s+', 'throw'),
-                (r'^break$', 'break'),
-                (r'^continue$', 'continue'),
-                (r'^\w+\s*\(.*\)\s*$', 'chiamata funzione'),
-                (r'^unset\s*\(', 'unset'),
-                (r'^isset\s*\(', 'isset'),
-                (r'^empty\s*\(', 'empty'),
-                (r'^list\s*\(', 'list'),
-            ]
-            
-            for pattern, stmt_type in statements:
-                if re.match(pattern, stripped):
+            for pattern, stmt_type in _STATEMENT_PATTERNS:
+                if pattern.match(stripped):
                     needs_semicolon = True
                     break
             
             # Se la linea dovrebbe terminare con ; ma non lo fa
             if needs_semicolon and not stripped.endswith(';'):
                 errors.append(SyntaxError(
-                    i, stripped, "Punto e virgola mancante",
+                    i, stripped, _ERR_PUNTO_E_VIRGOLA,
                     "La linea dovrebbe terminare con ;",
                     "Aggiungi ';' alla fine della riga"
                 ))
@@ -225,21 +217,8 @@ class SemicolonChecker(PluginBase):
 
     def _check_multiline_string_start(self, line: str) -> str:
         """Controlla se la linea inizia una stringa multi-riga e ritorna il carattere di virgolette"""
-        # Pattern per riconoscere l'inizio di stringhe multi-riga
-        patterns = [
-            # $var = $obj->method("
-            (r'^\$\w+\s*=\s*\$\w+\s*->\s*\w+\s*\(\s*"$', '"'),
-            (r'^\$\w+\s*=\s*\$\w+\s*->\s*\w+\s*\(\s*\'$', "'"),
-            # $var = function("
-            (r'^\$\w+\s*=\s*\w+\s*\(\s*"$', '"'),
-            (r'^\$\w+\s*=\s*\w+\s*\(\s*\'$', "'"),
-            # Varianti con spazi
-            (r'^\$\w+\s*=\s*\$\w+\s*->\s*\w+\s*\(\s*"\s*$', '"'),
-            (r'^\$\w+\s*=\s*\$\w+\s*->\s*\w+\s*\(\s*\'\s*$', "'"),
-        ]
-        
-        for pattern, quote_char in patterns:
-            if re.match(pattern, line):
+        for pattern, quote_char in _MULTILINE_START_PATTERNS:
+            if pattern.match(line):
                 return quote_char
         
         return None
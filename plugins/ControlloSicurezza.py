@@ -3,10 +3,21 @@
 Plugin per il controllo della sicurezza per PHP Analyzer
 Identifica potenziali vulnerabilità di sicurezza nel codice PHP
 """
+from bisect import bisect_right
 from typing import List, Dict
+import os
+import re
+import sys
 
+# Hyperscan è opzionale: se installato, individua le linee candidate in un solo
+# passaggio sull'intero file; altrimenti si usa solo il modulo re
 try:
-    from analizzatore import PluginBase, SyntaxError
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    from analizzatore import PluginBase, SyntaxError, matches_globs
 except ImportError:
     # Definizione di fallback per IDE
     class PluginBase:
@@ -18,6 +29,8 @@ except ImportError:
         def get_hooks(self): pass
 
     class SyntaxError:
+        __slots__ = ('line_number', 'line_content', 'error_type', 'description', 'suggestion')
+
         def __init__(self, line_number, line_content, error_type, description, suggestion):
             self.line_number = line_number
             self.line_content = line_content
@@ -25,6 +38,150 @@ except ImportError:
             self.description = description
             self.suggestion = suggestion
 
+    # Il confronto con i pattern di esclusione non dipende dall'interfaccia: lo si importa dal modulo comune
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from phpstate import matches_globs
+
+def _fused(descriptions, tail):
+    """
+    Unisce in un solo pattern le funzioni che condividono la stessa forma: il primo gruppo
+    cattura il nome della funzione, da cui si ricava la descrizione
+    """
+    # I nomi più lunghi per primi, così shell_exec non viene letto come exec
+    names = '|'.join(sorted(descriptions, key=len, reverse=True))
+    return rf'({names}){tail}', descriptions
+
+# Pattern per rilevare possibili SQL Injection (compilati una sola volta)
+_SQL_INJECTION_PATTERNS = tuple(
+    (re.compile(pattern), description) for pattern, description in [
+        (r'mysqli_query\s*\(\s*[^,]+\s*,\s*\$[^)]*\s*\)', "Uso diretto di variabili in query SQL"),
+        (r'mysql_query\s*\(\s*\$[^)]*\s*\)', "Uso diretto di variabili in query SQL"),
+        (r'PDO.*->query\s*\(\s*\$[^)]*\s*\)', "Uso diretto di variabili in query PDO"),
+        (r'SELECT\s+.*\s+FROM\s+.*\s+WHERE\s+.*\s*=\s*\$', "Query SQL con potenziale vulnerabilità"),
+        (r'INSERT\s+INTO\s+.*\s+VALUES\s*\(\s*.*\$', "Query SQL con potenziale vulnerabilità"),
+        (r'UPDATE\s+.*\s+SET\s+.*\s*=\s*\$', "Query SQL con potenziale vulnerabilità")
+    ]
+)
+
+# Pattern per rilevare possibili XSS (compilati una sola volta)
+_XSS_PATTERNS = tuple(
+    (re.compile(pattern), description) for pattern, description in [
+        (r'echo\s+\$_(POST|GET|REQUEST|COOKIE|SERVER)', {
+            "POST": "Output diretto di dati POST",
+            "GET": "Output diretto di dati GET",
+            "REQUEST": "Output diretto di dati REQUEST",
+            "COOKIE": "Output diretto di dati COOKIE",
+            "SERVER": "Output diretto di dati SERVER",
+        }),
+        (r'echo\s+\$.*\[', "Output diretto di array senza sanitizzazione"),
+        (r'print\s+\$_', "Output diretto di superglobale PHP"),
+        (r'<\?=\s*\$_', "Output diretto tramite short tag")
+    ]
+)
+
+# Pattern per rilevare possibili Local/Remote File Inclusion (compilati una sola volta)
+_FILE_INCLUSION_PATTERNS = tuple(
+    (re.compile(pattern), description) for pattern, description in [
+        _fused({
+            "include": "Include dinamico da variabile",
+            "include_once": "Include_once dinamico da variabile",
+            "require": "Require dinamico da variabile",
+            "require_once": "Require_once dinamico da variabile",
+            "file_get_contents": "File get contents da variabile",
+        }, r'\s*\(\s*\$')
+    ]
+)
+
+# Pattern per rilevare possibili Command Injection (compilati una sola volta)
+_COMMAND_INJECTION_PATTERNS = tuple(
+    (re.compile(pattern), description) for pattern, description in [
+        _fused({
+            "system": "Esecuzione di comando da variabile",
+            "exec": "Esecuzione di comando da variabile",
+            "shell_exec": "Esecuzione di comando da variabile",
+            "passthru": "Esecuzione di comando da variabile",
+            "eval": "Eval di codice da variabile",
+            "popen": "Apertura pipe da variabile",
+            "proc_open": "Apertura processo da variabile",
+        }, r'\s*\(\s*\$')
+    ]
+)
+
+def _combine(patterns):
+    """Unisce i pattern di una categoria in un'unica alternanza usata come prefiltro"""
+    return re.compile('|'.join(f'(?:{pattern.pattern})' for pattern, _ in patterns))
+
+def _description_key(description, match):
+    """Indice della descrizione: 0 per i pattern semplici, la funzione catturata per quelli fusi"""
+    if isinstance(description, str):
+        return 0
+    return list(description).index(match.group(1))
+
+def _describe(description, key):
+    """Descrizione dell'errore a partire dall'indice restituito da _description_key"""
+    if isinstance(description, str):
+        return description
+    return list(description.values())[key]
+
+def _confine_to_line(pattern):
+    """
+    Variante del pattern che non attraversa mai un a capo, per cercarlo sull'intero file:
+    ogni corrispondenza resta su una sola linea, come nella ricerca linea per linea
+    """
+    source = (pattern.pattern
+              .replace(r'\s', r'[^\S\n]')
+              .replace('[^,]', r'[^,\n]')
+              .replace('[^)]', r'[^)\n]'))
+    return re.compile(source)
+
+# Categorie di controllo: (opzione di configurazione, prefiltro, pattern, tipo errore internato,
+# suggerimento, pattern confinati alla linea). Il prefiltro è un'unica ricerca per linea: i singoli pattern
+# vengono provati solo sulle linee in cui l'alternanza trova qualcosa, per attribuire le descrizioni
+_CATEGORIES = tuple(
+    (option, _combine(patterns), patterns, sys.intern(error_type), suggestion,
+     tuple(_confine_to_line(pattern) for pattern, _ in patterns))
+    for option, patterns, error_type, suggestion in (
+        ("check_sql_injection", _SQL_INJECTION_PATTERNS,
+         "Rischio SQL Injection",
+         "Usa prepared statements o escape/sanitizza i dati con mysqli_real_escape_string o PDO::prepare"),
+        ("check_xss", _XSS_PATTERNS,
+         "Rischio XSS",
+         "Usa htmlspecialchars o htmlentities per sanitizzare l'output"),
+        ("check_file_inclusion", _FILE_INCLUSION_PATTERNS,
+         "Rischio File Inclusion",
+         "Valida e filtra il percorso del file prima di includerlo"),
+        ("check_command_injection", _COMMAND_INJECTION_PATTERNS,
+         "Rischio Command Injection",
+         "Evita di eseguire comandi da input utente o sanitizza con escapeshellarg/escapeshellcmd"),
+    )
+)
+
+# Prefiltro comune a tutte le categorie: la maggior parte delle linee si ferma qui
+_ANY_DANGEROUS = _combine(
+    _SQL_INJECTION_PATTERNS + _XSS_PATTERNS + _FILE_INCLUSION_PATTERNS + _COMMAND_INJECTION_PATTERNS
+)
+
+def _build_hyperscan_database():
+    """Compila tutti i pattern in un unico database Hyperscan, se disponibile"""
+    if hyperscan is None:
+        return None
+    
+    expressions = [pattern.pattern.encode('utf-8') for category in _CATEGORIES for pattern, _ in category[2]]
+    try:
+        database = hyperscan.Database()
+        database.compile(
+            expressions=expressions,
+            ids=list(range(len(expressions))),
+            elements=len(expressions),
+            flags=[hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP] * len(expressions)
+        )
+    except Exception as e:
+        print(f"Hyperscan non utilizzabile, uso il modulo re: {e}")
+        return None
+    return database
+
+_HYPERSCAN_DATABASE = _build_hyperscan_database()
+
 class SicurezzaPlugin(PluginBase):
     """
     Plugin per il controllo delle vulnerabilità di sicurezza nel codice PHP
@@ -78,134 +235,124 @@ class SicurezzaPlugin(PluginBase):
         if self._should_exclude_file(filepath, config):
             return errors
         
-        # Controlla SQL Injection
-        if config.get("check_sql_injection", True):
-            errors.extend(self._check_sql_injection(lines))
-        
-        # Controlla XSS
-        if config.get("check_xss", True):
-            errors.extend(self._check_xss(lines))
+        # Categorie abilitate nella configurazione
+        active = [category for category in _CATEGORIES if config.get(category[0], True)]
+        if not active:
+            return errors
         
-        # Controlla File Inclusion
-        if config.get("check_file_inclusion", True):
-            errors.extend(self._check_file_inclusion(lines))
+        # Terne (indice linea, indice pattern, indice descrizione) per categoria, ordinate per linea
+        category_hits = self._hyperscan_hits(lines, active)
+        if category_hits is None:
+            category_hits = self._buffer_hits(lines, active)
         
-        # Controlla Command Injection
-        if config.get("check_command_injection", True):
-            errors.extend(self._check_command_injection(lines))
+        for (_, _, patterns, error_type, suggestion, _), hits in zip(active, category_hits):
+            for index, pattern_index, key in hits:
+                line = lines[index]
+                # Le linee con solo un commento non vengono segnalate (ma gli attributi #[...] sì)
+                lstripped = line.lstrip()
+                if lstripped.startswith(('//', '#')) and not lstripped.startswith('#['):
+                    continue
+                errors.append(SyntaxError(
+                    index + 1, line.strip(), error_type, _describe(patterns[pattern_index][1], key), suggestion
+                ))
         
         return errors
     
-    def _should_exclude_file(self, filepath: str, config: Dict) -> bool:
-        """Verifica se il file deve essere escluso dall'analisi"""
-        import fnmatch
-        exclude_patterns = config.get("exclude_patterns", [])
+    def _buffer_hits(self, lines: List[str], active) -> List[List[tuple]]:
+        """
+        Cerca ogni pattern una sola volta sull'intero file con finditer
         
-        for pattern in exclude_patterns:
-            if fnmatch.fnmatch(filepath, pattern):
-                return True
-        return False
-    
-    def _check_sql_injection(self, lines: List[str]) -> List[SyntaxError]:
-        """Controlla possibili vulnerabilità di SQL Injection"""
-        errors = []
+        I pattern confinati alla linea non attraversano mai un a capo, quindi le corrispondenze
+        sul buffer sono le stesse della ricerca linea per linea; bisect ricava la linea.
         
-        # Pattern per rilevare possibili SQL Injection
-        dangerous_patterns = [
-            (r'mysqli_query\s*\(\s*[^,]+\s*,\s*\$[^)]*\s*\)', "Uso diretto di variabili in query SQL"),
-            (r'mysql_query\s*\(\s*\$[^)]*\s*\)', "Uso diretto di variabili in query SQL"),
-            (r'PDO.*->query\s*\(\s*\$[^)]*\s*\)', "Uso diretto di variabili in query PDO"),
-            (r'SELECT\s+.*\s+FROM\s+.*\s+WHERE\s+.*\s*=\s*\$', "Query SQL con potenziale vulnerabilità"),
-            (r'INSERT\s+INTO\s+.*\s+VALUES\s*\(\s*.*\$', "Query SQL con potenziale vulnerabilità"),
-            (r'UPDATE\s+.*\s+SET\s+.*\s*=\s*\$', "Query SQL con potenziale vulnerabilità")
-        ]
-        
-        for i, line in enumerate(lines, 1):
-            for pattern, description in dangerous_patterns:
-                if re.search(pattern, line):
-                    errors.append(SyntaxError(
-                        i, line.strip(),
-                        "Rischio SQL Injection",
-                        description,
-                        "Usa prepared statements o escape/sanitizza i dati con mysqli_real_escape_string o PDO::prepare"
-                    ))
+        Returns:
+            Per ogni categoria attiva, le terne (indice linea, indice pattern, indice descrizione) ordinate
+        """
+        full_code = '\n'.join(lines)
+        # Tutti i pattern richiedono una variabile: senza '$' il file non può corrispondere
+        if '$' not in full_code:
+            return [[] for _ in active]
         
-        return errors
+        # Offset dell'inizio di ogni linea nel buffer unito con '\n'
+        line_starts = []
+        offset = 0
+        for line in lines:
+            line_starts.append(offset)
+            offset += len(line) + 1
+        
+        result = []
+        for category in active:
+            # Una sola segnalazione per linea, pattern e descrizione
+            hits = set()
+            for pattern_index, (pattern, (_, description)) in enumerate(zip(category[5], category[2])):
+                for match in pattern.finditer(full_code):
+                    index = bisect_right(line_starts, match.start()) - 1
+                    hits.add((index, pattern_index, _description_key(description, match)))
+            result.append(sorted(hits))
+        return result
     
-    def _check_xss(self, lines: List[str]) -> List[SyntaxError]:
-        """Controlla possibili vulnerabilità XSS"""
-        errors = []
+    def _hyperscan_hits(self, lines: List[str], active):
+        """
+        Conferma con i pattern re le sole linee candidate trovate da Hyperscan
         
-        # Pattern per rilevare possibili XSS
-        dangerous_patterns = [
-            (r'echo\s+\$_POST', "Output diretto di dati POST"),
-            (r'echo\s+\$_GET', "Output diretto di dati GET"),
-            (r'echo\s+\$_REQUEST', "Output diretto di dati REQUEST"),
-            (r'echo\s+\$_COOKIE', "Output diretto di dati COOKIE"),
-            (r'echo\s+\$_SERVER', "Output diretto di dati SERVER"),
-            (r'echo\s+\$.*\[', "Output diretto di array senza sanitizzazione"),
-            (r'print\s+\$_', "Output diretto di superglobale PHP"),
-            (r'<\?=\s*\$_', "Output diretto tramite short tag")
-        ]
-        
-        for i, line in enumerate(lines, 1):
-            for pattern, description in dangerous_patterns:
-                if re.search(pattern, line):
-                    errors.append(SyntaxError(
-                        i, line.strip(),
-                        "Rischio XSS",
-                        description,
-                        "Usa htmlspecialchars o htmlentities per sanitizzare l'output"
-                    ))
+        Returns:
+            Per ogni categoria attiva, le terne (indice linea, indice pattern, indice descrizione)
+            ordinate, oppure None se Hyperscan non è disponibile
+        """
+        candidate_lines = self._hyperscan_candidate_lines(lines)
+        if candidate_lines is None:
+            return None
         
-        return errors
+        result = [[] for _ in active]
+        for index in candidate_lines:
+            line = lines[index]
+            if '$' not in line or not _ANY_DANGEROUS.search(line):
+                continue
+            for (_, prefilter, patterns, _, _, _), hits in zip(active, result):
+                if not prefilter.search(line):
+                    continue
+                for pattern_index, (pattern, description) in enumerate(patterns):
+                    keys = sorted({_description_key(description, match) for match in pattern.finditer(line)})
+                    hits.extend((index, pattern_index, key) for key in keys)
+        return result
     
-    def _check_file_inclusion(self, lines: List[str]) -> List[SyntaxError]:
-        """Controlla possibili vulnerabilità di Local/Remote File Inclusion"""
-        errors = []
+    def _hyperscan_candidate_lines(self, lines: List[str]):
+        """
+        Scansiona l'intero file con il database Hyperscan
         
-        dangerous_patterns = [
-            (r'include\s*\(\s*\$', "Include dinamico da variabile"),
-            (r'include_once\s*\(\s*\$', "Include_once dinamico da variabile"),
-            (r'require\s*\(\s*\$', "Require dinamico da variabile"),
-            (r'require_once\s*\(\s*\$', "Require_once dinamico da variabile"),
-            (r'file_get_contents\s*\(\s*\$', "File get contents da variabile")
-        ]
-        
-        for i, line in enumerate(lines, 1):
-            for pattern, description in dangerous_patterns:
-                if re.search(pattern, line):
-                    errors.append(SyntaxError(
-                        i, line.strip(),
-                        "Rischio File Inclusion",
-                        description,
-                        "Valida e filtra il percorso del file prima di includerlo"
-                    ))
+        Returns:
+            Gli indici ordinati delle linee con almeno una corrispondenza,
+            oppure None se Hyperscan non è disponibile
+        """
+        if _HYPERSCAN_DATABASE is None:
+            return None
         
-        return errors
-    
-    def _check_command_injection(self, lines: List[str]) -> List[SyntaxError]:
-        """Controlla possibili vulnerabilità di Command Injection"""
-        errors = []
+        # Offset in byte dell'inizio di ogni linea nel buffer unito con '\n'
+        line_starts = []
+        chunks = []
+        offset = 0
+        try:
+            for line in lines:
+                chunk = line.encode('utf-8')
+                line_starts.append(offset)
+                chunks.append(chunk)
+                offset += len(chunk) + 1
+        except UnicodeEncodeError:
+            return None
         
-        dangerous_patterns = [
-            (r'system\s*\(\s*\$', "Esecuzione di comando da variabile"),
-            (r'exec\s*\(\s*\$', "Esecuzione di comando da variabile"),
-            (r'shell_exec\s*\(\s*\$', "Esecuzione di comando da variabile"),
-            (r'passthru\s*\(\s*\$', "Esecuzione di comando da variabile"),
-            (r'eval\s*\(\s*\$', "Eval di codice da variabile"),
-            (r'popen\s*\(\s*\$', "Apertura pipe da variabile"),
-            (r'proc_open\s*\(\s*\$', "Apertura processo da variabile")
-        ]
-        
-        for i, line in enumerate(lines, 1):
-            for pattern, description in dangerous_patterns:
-                if re.search(pattern, line):
-                    errors.append(SyntaxError(
-                        i, line.strip(),
-                        "Rischio Command Injection",
-                        description,
-                        "Evita di eseguire comandi da input utente o sanitizza con escapeshellarg/escapeshellcmd"
-                    ))
-        
-        return errors
\ No newline at end of file
+        candidates = set()
+        
+        def on_match(pattern_id, start, end, flags, context):
+            # end è esclusivo: l'ultimo byte corrispondente appartiene alla linea candidata
+            candidates.add(bisect_right(line_starts, end - 1) - 1)
+        
+        try:
+            _HYPERSCAN_DATABASE.scan(b'\n'.join(chunks), match_event_handler=on_match)
+        except Exception:
+            return None
+        
+        return sorted(candidates)
+    
+    def _should_exclude_file(self, filepath: str, config: Dict) -> bool:
+        """Verifica se il file deve essere escluso dall'analisi"""
+        return matches_globs(filepath, tuple(config.get("exclude_patterns", [])))
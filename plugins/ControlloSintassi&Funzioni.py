@@ -3,10 +3,12 @@
 Plugin per il controllo della sintassi delle funzioni in PHP
 """
 from typing import List, Tuple
+import os
 import re
+import sys
 
 try:
-    from analizzatore import PluginBase, SyntaxError
+    from analizzatore import PluginBase, SyntaxError, PhpFileState
 except ImportError:
     # Definizione di fallback per IDE
     class PluginBase:
@@ -14,12 +16,23 @@ except ImportError:
         def get_hooks(self): pass
     
     class SyntaxError:
+        __slots__ = ('line_number', 'line_content', 'error_type', 'description', 'suggestion')
+        
         def __init__(self, line_number, line_content, error_type, description, suggestion):
             self.line_number = line_number
             self.line_content = line_content
             self.error_type = error_type
             self.description = description
             self.suggestion = suggestion
+    
+    # Lo stato condiviso non dipende dall'interfaccia: lo si importa dal modulo comune
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from phpstate import PhpFileState
+
+# Dichiarazione di funzione PHP, anche con la graffa sulla linea successiva. Senza '^':
+# viene usata con match a partire dall'inizio della linea, che la ancora già lì
+_FUNCTION_DECLARATION_RE = re.compile(r'\s*(public|private|protected|static)?\s*function\s+\w+\s*\([^)]*\)\s*{')
+_ANONYMOUS_FUNCTION_RE = re.compile(r'function\s*\([^)]*\)\s*{')
 
 class FunctionSyntaxChecker(PluginBase):
     """
@@ -46,23 +59,26 @@ class FunctionSyntaxChecker(PluginBase):
             'syntax_check': [self.check_function_syntax]
         }
     
-    def _is_in_html_block(self, lines: List[str], line_num: int) -> bool:
-        """Verifica se una linea è all'interno di un blocco HTML (dopo ?>)"""
-        in_php = True
-        for i in range(line_num):
-            if '<?php' in lines[i] or '<?' in lines[i]:
-                in_php = True
-            elif '?>' in lines[i]:
-                in_php = False
-        return not in_php
-    
     def check_function_syntax(self, filepath: str, lines: List[str], plugin_config=None, **kwargs) -> List[SyntaxError]:
         """Controlla la sintassi delle funzioni"""
         errors = []
         
+        # Stato HTML condiviso dall'analizzatore, oppure calcolato qui
+        state = kwargs.get('php_state') or PhpFileState(lines)
+        in_html = state.in_html
+        
+        # Testo unito e offset di inizio linea: la dichiarazione viene cercata sulla linea
+        # e sulla successiva direttamente nel buffer, senza concatenare stringhe per ogni linea
+        full_code = state.text
+        line_starts = state.line_starts
+        
         for i, line in enumerate(lines, 1):
+            # Salta subito le linee vuote e quelle con solo un commento
+            if state.is_comment_only(i - 1):
+                continue
+                
             # Se siamo in un blocco HTML, salta
-            if self._is_in_html_block(lines, i - 1):
+            if in_html[i - 1]:
                 continue
                 
             # Non controllare funzioni JavaScript
@@ -71,11 +87,12 @@ class FunctionSyntaxChecker(PluginBase):
                 continue
                 
             if 'function' in line:
-                # Controlla sintassi base funzione PHP
-                pattern = r'^\s*(public|private|protected|static)?\s*function\s+\w+\s*\([^)]*\)\s*{'
-                if not re.match(pattern, line) and not re.match(pattern, line + (lines[i] if i < len(lines) else '')):
+                # Controlla sintassi base funzione PHP: match ancorato solo all'inizio, quindi
+                # se la linea da sola corrisponde corrisponde anche insieme alla successiva
+                end = line_starts[min(i + 1, len(lines))]
+                if not _FUNCTION_DECLARATION_RE.match(full_code, line_starts[i - 1], end):
                     # Verifica se è una funzione JavaScript anonima
-                    if not re.search(r'function\s*\([^)]*\)\s*{', line):
+                    if not _ANONYMOUS_FUNCTION_RE.search(line):
                         errors.append(SyntaxError(
                             i, line.strip(), "Sintassi funzione errata",
                             "La dichiarazione della funzione non segue il pattern corretto",
@@ -2,11 +2,13 @@
 """
 Plugin per il controllo della sintassi delle variabili in PHP
 """
-from typing import List, Tuple
+from typing import List
+import os
 import re
+import sys
 
 try:
-    from analizzatore import PluginBase, SyntaxError
+    from analizzatore import PluginBase, SyntaxError, PhpFileState
 except ImportError:
     # Definizione di fallback per IDE
     class PluginBase:
@@ -14,12 +16,28 @@ except ImportError:
         def get_hooks(self): pass
     
     class SyntaxError:
+        __slots__ = ('line_number', 'line_content', 'error_type', 'description', 'suggestion')
+        
         def __init__(self, line_number, line_content, error_type, description, suggestion):
             self.line_number = line_number
             self.line_content = line_content
             self.error_type = error_type
             self.description = description
             self.suggestion = suggestion
+    
+    # Lo stato condiviso non dipende dall'interfaccia: lo si importa dal modulo comune
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from phpstate import PhpFileState
+
+# Pattern compilati una sola volta al caricamento del modulo
+_JAVASCRIPT_RE = re.compile(r'<script|var\s+\w+|let\s+\w+|const\s+\w+|document\.|function\s*\(')
+
+# Assegnazione: il primo gruppo contiene il $ se presente, il secondo il nome.
+# Esclude le proprietà ($obj->nome, Classe::nome), i confronti (==) e le chiavi degli array (=>)
+_ASSIGNMENT_RE = re.compile(r'(?<!->)(?<!::)(\$?)\b([A-Za-z_]\w*)\s*=(?![=>])')
+
+# Parole chiave che possono precedere un = senza essere variabili
+_ASSIGNMENT_KEYWORDS = frozenset({'function', 'class', 'public', 'private', 'protected', 'static', 'const', 'var'})
 
 class VariableSyntaxChecker(PluginBase):
     """
@@ -46,95 +64,51 @@ class VariableSyntaxChecker(PluginBase):
             'syntax_check': [self.check_variable_syntax]
         }
     
-    def _is_in_html_context(self, line: str, pos: int) -> bool:
-    """Verifica se siamo in un contesto HTML dentro echo/print"""
-    # Cerca se siamo dentro un echo o print con HTML
-    echo_match = re.search(r'echo\s+["\'].*?["\']', line[:pos])
-    print_match = re.search(r'print\s+["\'].*?["\']', line[:pos])
-    
-    if echo_match or print_match:
-        # Verifica se contiene tag HTML
-        if re.search(r'<[^>]+>', line):
-            return True
-    return False
-    
-    def _is_in_comment(self, lines: List[str], line_num: int) -> Tuple[bool, bool]:
-        """Verifica se una linea è in un commento. Ritorna (in_single_comment, in_multi_comment)"""
-        line = lines[line_num - 1]
-        
-        # Commento single-line
-        if '//' in line:
-            comment_pos = line.find('//')
-            # Verifica se // è dentro una stringa
-            if not self._is_in_string(line, comment_pos):
-                return True, False
-                
-        # Verifica commenti multi-line
-        in_multi = False
-        for i in range(line_num):
-            if '/*' in lines[i]:
-                in_multi = True
-            if '*/' in lines[i]:
-                in_multi = False
-                
-        return False, in_multi
-    
-    def _is_in_string(self, line: str, pos: int) -> bool:
-        """Verifica se una posizione è all'interno di una stringa"""
-        in_single = False
-        in_double = False
-        escaped = False
-        
-        for i in range(pos):
-            char = line[i]
-            if escaped:
-                escaped = False
-                continue
-                
-            if char == '\\':
-                escaped = True
-                continue
-                
-            if char == "'" and not in_double:
-                in_single = not in_single
-            elif char == '"' and not in_single:
-                in_double = not in_double
-                
-        return in_single or in_double
-    
     def check_variable_syntax(self, filepath: str, lines: List[str], plugin_config=None, **kwargs) -> List[SyntaxError]:
         """Controlla la sintassi delle variabili"""
         errors = []
         
+        # Stato HTML/commenti condiviso dall'analizzatore, oppure calcolato qui
+        state = kwargs.get('php_state') or PhpFileState(lines)
+        in_html, in_multi = state.in_html, state.in_multi_comment
+        
         for i, line in enumerate(lines, 1):
+            # Salta subito le linee vuote e quelle con solo un commento
+            if state.is_comment_only(i - 1):
+                continue
+                
             # Se siamo in un blocco HTML o JavaScript, salta
-            if self._is_in_html_block(lines, i - 1):
+            if in_html[i - 1]:
                 continue
                 
             # Ignora il codice JavaScript
-            if re.search(r'<script|var\s+\w+|let\s+\w+|const\s+\w+|document\.|function\s*\(', line):
+            if _JAVASCRIPT_RE.search(line):
                 continue
                 
             # Ignora commenti
-            in_single_comment, in_multi_comment = self._is_in_comment(lines, i)
-            if in_single_comment or in_multi_comment:
+            if state.comment_pos(i - 1) != -1 or in_multi[i - 1]:
                 continue
                 
-            # Trova variabili senza $ in PHP
-            words = re.findall(r'\b\w+\b', line)
-            for word in words:
-                # Se la parola è seguita da = e non è una keyword
-                match = re.search(fr'\b{word}\s*=(?!=)', line)
-                if match:
-                    if word not in ['function', 'class', 'public', 'private', 'protected', 'static', 'const', 'var']:
-                        # Verifica che non sia in una stringa o in JavaScript
-                        if not self._is_in_string(line, match.start()):
-                            # Verifica che non sia già una variabile PHP con $
-                            if not re.search(fr'\${word}', line):
-                                errors.append(SyntaxError(
-                                    i, line.strip(), "Variabile senza $",
-                                    f"La variabile '{word}' non ha il simbolo $",
-                                    f"Cambia '{word}' in '${word}'"
-                                ))
+            # Trova variabili senza $ in PHP: assegnazioni a un nome senza $
+            stripped = None
+            for match in _ASSIGNMENT_RE.finditer(line):
+                if match.group(1):
+                    continue
+                word = match.group(2)
+                if word in _ASSIGNMENT_KEYWORDS:
+                    continue
+                # Verifica che non sia in una stringa o in JavaScript
+                if state.is_in_string(i - 1, match.start(2)):
+                    continue
+                # Verifica che non sia già una variabile PHP con $
+                if '$' + word in line:
+                    continue
+                if stripped is None:
+                    stripped = line.strip()
+                errors.append(SyntaxError(
+                    i, stripped, "Variabile senza $",
+                    f"La variabile '{word}' non ha il simbolo $",
+                    f"Cambia '{word}' in '${word}'"
+                ))
         
         return errors
\ No newline at end of file
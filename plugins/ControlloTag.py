@@ -13,6 +13,8 @@ except ImportError:
         def get_hooks(self): pass
     
     class SyntaxError:
+        __slots__ = ('line_number', 'line_content', 'error_type', 'description', 'suggestion')
+        
         def __init__(self, line_number, line_content, error_type, description, suggestion):
             self.line_number = line_number
             self.line_content = line_content
@@ -51,8 +53,18 @@ class PHPTagsChecker(PluginBase):
         php_open = False
         open_line = 0
         
+        # Conteggio dei tag sull'intero file: con al più un'apertura, seguita dall'eventuale
+        # unica chiusura, non ci possono essere errori e il ciclo per linea non serve
+        # (unite con '\n' perché un tag non venga mai composto a cavallo di due linee)
+        full_code = '\n'.join(lines)
+        opens = full_code.count('<?')
+        closes = full_code.count('?>')
+        if opens <= 1 and (closes == 0 or (opens == 1 and closes == 1 and full_code.find('<?') < full_code.find('?>'))):
+            return errors
+        
         for i, line in enumerate(lines, 1):
-            if '<?php' in line or '<?' in line:
+            # '<?' comprende anche '<?php'
+            if '<?' in line:
                 if php_open:
                     errors.append(SyntaxError(
                         i, line.strip(), "Tag PHP già aperto",
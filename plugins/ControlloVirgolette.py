@@ -2,11 +2,13 @@
 """
 Plugin per il controllo delle virgolette in PHP
 """
-from typing import List, Tuple
+from typing import List
+import os
 import re
+import sys
 
 try:
-    from analizzatore import PluginBase, SyntaxError
+    from analizzatore import PluginBase, SyntaxError, PhpFileState
 except ImportError:
     # Definizione di fallback per IDE
     class PluginBase:
@@ -14,12 +16,47 @@ except ImportError:
         def get_hooks(self): pass
     
     class SyntaxError:
+        __slots__ = ('line_number', 'line_content', 'error_type', 'description', 'suggestion')
+        
         def __init__(self, line_number, line_content, error_type, description, suggestion):
             self.line_number = line_number
             self.line_content = line_content
             self.error_type = error_type
             self.description = description
             self.suggestion = suggestion
+    
+    # Lo stato condiviso non dipende dall'interfaccia: lo si importa dal modulo comune
+    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from phpstate import PhpFileState
+
+# Caratteri che cambiano lo stato delle stringhe: virgolette e backslash di escape
+_QUOTE_OR_ESCAPE_RE = re.compile(r'[\\\'"]')
+
+# Dentro una stringa conta solo la virgoletta che l'ha aperta (oltre al backslash)
+_CLOSING_QUOTE_RE = {
+    '"': re.compile(r'[\\"]'),
+    "'": re.compile(r"[\\']"),
+}
+
+# Messaggi (tipo errore, descrizione, suggerimento) per ciascun tipo di virgoletta, costruiti una volta
+_QUOTE_MESSAGES = {
+    char: (
+        f"Virgoletta {quote_type} non chiusa",
+        f"La stringa iniziata con {char} non è stata chiusa",
+        f"Verifica se manca una {char} alla fine della stringa"
+    )
+    for char, quote_type in (("'", 'singola'), ('"', 'doppia'))
+}
+
+# echo/print seguiti da virgolette di apertura, con o senza parentesi
+_ECHO_PRINT_RE = re.compile(r'\s*(?:echo|print)(?:\s+|\s*\(\s*)["\']')
+
+# Chiamate prepare()/query() e parole chiave SQL più comuni, cercate come sottostringhe
+# senza distinzione tra maiuscole e minuscole (JOIN copre anche INNER/LEFT/RIGHT JOIN)
+_SQL_QUERY_RE = re.compile(
+    r'prepare\(|query\(|SELECT|INSERT|UPDATE|DELETE|FROM|WHERE|JOIN|ORDER BY|GROUP BY|HAVING|UNION|CREATE|ALTER|DROP|INDEX',
+    re.IGNORECASE
+)
 
 class QuotesChecker(PluginBase):
     """
@@ -46,60 +83,6 @@ class QuotesChecker(PluginBase):
             'syntax_check': [self.check_quotes]
         }
     
-    def _is_in_html_block(self, lines: List[str], line_num: int) -> bool:
-        """Verifica se una linea è all'interno di un blocco HTML (dopo ?>)"""
-        in_php = True
-        for i in range(line_num):
-            if '<?php' in lines[i] or '<?' in lines[i]:
-                in_php = True
-            elif '?>' in lines[i]:
-                in_php = False
-        return not in_php
-    
-    def _is_in_comment(self, lines: List[str], line_num: int) -> Tuple[bool, bool]:
-        """Verifica se una linea è in un commento. Ritorna (in_single_comment, in_multi_comment)"""
-        line = lines[line_num - 1]
-        
-        # Commento single-line
-        if '//' in line:
-            comment_pos = line.find('//')
-            # Verifica se // è dentro una stringa
-            if not self._is_in_string(line, comment_pos):
-                return True, False
-                
-        # Verifica commenti multi-line
-        in_multi = False
-        for i in range(line_num):
-            if '/*' in lines[i]:
-                in_multi = True
-            if '*/' in lines[i]:
-                in_multi = False
-                
-        return False, in_multi
-    
-    def _is_in_string(self, line: str, pos: int) -> bool:
-        """Verifica se una posizione è all'interno di una stringa"""
-        in_single = False
-        in_double = False
-        escaped = False
-        
-        for i in range(pos):
-            char = line[i]
-            if escaped:
-                escaped = False
-                continue
-                
-            if char == '\\':
-                escaped = True
-                continue
-                
-            if char == "'" and not in_double:
-                in_single = not in_single
-            elif char == '"' and not in_single:
-                in_double = not in_double
-                
-        return in_single or in_double
-    
     def check_quotes(self, filepath: str, lines: List[str], plugin_config=None, **kwargs) -> List[SyntaxError]:
         """Controlla virgolette non chiuse - versione migliorata per gestire stringhe multilinea"""
         errors = []
@@ -107,42 +90,53 @@ class QuotesChecker(PluginBase):
         string_char = None
         string_start_line = 0
         
+        # Stato HTML/commenti condiviso dall'analizzatore, oppure calcolato qui:
+        # un solo passaggio sul file invece di ripartire dall'inizio per ogni linea
+        state = kwargs.get('php_state') or PhpFileState(lines)
+        in_html, in_multi = state.in_html, state.in_multi_comment
+        
         for i, line in enumerate(lines, 1):
             # Se siamo in un blocco HTML, salta
-            if self._is_in_html_block(lines, i - 1):
+            if in_html[i - 1]:
                 continue
-                
-            # Controlla se siamo in un commento
-            in_single_comment, in_multi_comment = self._is_in_comment(lines, i)
-            if in_multi_comment:
+            
+            # Senza virgolette e senza una stringa aperta lo stato non può cambiare
+            if not in_string and '"' not in line and "'" not in line:
                 continue
                 
-            # Se è un commento single-line, analizza solo la parte prima del commento
-            if in_single_comment and '//' in line:
-                comment_pos = line.find('//')
+            # Se è un commento single-line, analizza solo la parte prima del commento;
+            # altrimenti salta le linee dentro un commento multi-line
+            comment_pos = state.comment_pos(i - 1)
+            if comment_pos != -1:
                 line_to_check = line[:comment_pos]
+            elif in_multi[i - 1]:
+                continue
             else:
                 line_to_check = line
                 
-            # Analizza carattere per carattere
-            escaped = False
-            for j, char in enumerate(line_to_check):
-                if escaped:
-                    escaped = False
-                    continue
-                    
+            # Salta direttamente da una virgoletta o backslash al successivo: gli altri
+            # caratteri non cambiano lo stato
+            pos = 0
+            while True:
+                scanner = _CLOSING_QUOTE_RE[string_char] if in_string else _QUOTE_OR_ESCAPE_RE
+                match = scanner.search(line_to_check, pos)
+                if match is None:
+                    break
+                char = match.group()
+                pos = match.end()
+                
                 if char == '\\':
-                    escaped = True
+                    # Il carattere successivo è escapato
+                    pos += 1
                     continue
                     
-                if char in ['"', "'"]:
-                    if not in_string:
-                        in_string = True
-                        string_char = char
-                        string_start_line = i
-                    elif char == string_char:
-                        in_string = False
-                        string_char = None
+                if not in_string:
+                    in_string = True
+                    string_char = char
+                    string_start_line = i
+                elif char == string_char:
+                    in_string = False
+                    string_char = None
             
             # Se la stringa non è chiusa alla fine della riga, potrebbe essere multilinea
             # Verifica se è un caso valido di stringa multilinea
@@ -152,61 +146,19 @@ class QuotesChecker(PluginBase):
                     continue  # Non segnalare errore per query SQL
                 
                 # NUOVO: Verifica se è un echo/print con HTML multilinea
+                # (copre anche il controllo echo/print della logica originale)
                 if self._is_multiline_echo_or_print(line):
                     continue  # Non segnalare errore per echo/print multilinea
                 
-                # Controlla se è un echo/print che apre una stringa multilinea (logica originale)
-                if re.match(r'^\s*(echo|print)\s+["\']', line.strip()):
-                    # È probabilmente una stringa multilinea valida, non segnalare errore
-                    continue
-                else:
-                    # Potrebbe essere un errore reale
-                    quote_type = 'singola' if string_char == "'" else 'doppia'
-                    errors.append(SyntaxError(
-                        i, line.strip(), 
-                        f"Virgoletta {quote_type} non chiusa",
-                        f"La stringa iniziata con {string_char} non è stata chiusa",
-                        f"Verifica se manca una {string_char} alla fine della stringa"
-                    ))
+                # Potrebbe essere un errore reale
+                errors.append(SyntaxError(i, line.strip(), *_QUOTE_MESSAGES[string_char]))
         
         return errors
 
     def _is_sql_query(self, line: str) -> bool:
-        """Verifica se la linea contiene una query SQL"""
-        # Lista delle parole chiave SQL più comuni
-        sql_keywords = [
-            'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'FROM', 'WHERE', 'JOIN', 
-            'INNER JOIN', 'LEFT JOIN', 'RIGHT JOIN', 'ORDER BY', 'GROUP BY',
-            'HAVING', 'UNION', 'CREATE', 'ALTER', 'DROP', 'INDEX'
-        ]
-        
-        line_upper = line.upper().strip()
-        
-        # Verifica se la linea contiene prepare() con query SQL
-        if 'prepare(' in line.lower() or 'query(' in line.lower():
-            return True
-        
-        # Verifica se contiene parole chiave SQL
-        for keyword in sql_keywords:
-            if keyword in line_upper:
-                return True
-        
-        return False
+        """Verifica se la linea contiene una query SQL (prepare()/query() o parole chiave SQL)"""
+        return _SQL_QUERY_RE.search(line) is not None
 
     def _is_multiline_echo_or_print(self, line: str) -> bool:
         """Verifica se è un echo o print che inizia una stringa multilinea"""
-        line_stripped = line.strip()
-        
-        # Pattern per echo/print seguiti da virgolette di apertura
-        patterns = [
-            r'^\s*echo\s+["\']',
-            r'^\s*print\s+["\']',
-            r'^\s*echo\s*\(\s*["\']',
-            r'^\s*print\s*\(\s*["\']'
-        ]
-        
-        for pattern in patterns:
-            if re.match(pattern, line_stripped):
-                return True
-        
-        return False
\ No newline at end of file
+        return _ECHO_PRINT_RE.match(line.strip()) is not None
\ No newline at end of file
@@ -3,8 +3,18 @@
 Plugin di diagnostica per il PHP Analyzer
 """
 import os
-import tkinter as tk
-from tkinter import ttk, scrolledtext
+import re
+import time
+
+# Tkinter viene importato solo quando il plugin estende l'interfaccia grafica,
+# così il caricamento dei plugin in modalità riga di comando non carica Tk
+tk = ttk = scrolledtext = None
+
+def _import_tk():
+    """Importa i moduli Tkinter nei globali del modulo"""
+    global tk, ttk, scrolledtext
+    import tkinter as tk
+    from tkinter import ttk, scrolledtext
 
 try:
     from analizzatore import PluginBase
@@ -14,6 +24,28 @@ except ImportError:
         def get_id(self): pass
         def get_hooks(self): pass
 
+# Elementi cercati nei file dei plugin con un solo passaggio sul contenuto;
+# '(PluginBase)' viene prima di 'PluginBase', che altrimenti lo coprirebbe
+_PLUGIN_FEATURES_RE = re.compile(r'\(PluginBase\)|PluginBase|class|def get_hooks')
+_REQUIRED_FEATURES = frozenset(('(PluginBase)', 'class', 'def get_hooks'))
+
+def _find_plugin_features(lines):
+    """
+    Ritorna l'insieme degli elementi di _PLUGIN_FEATURES_RE presenti nelle linee.
+    Nessun elemento attraversa un a capo, quindi il file può essere letto linea per linea
+    """
+    found = set()
+    for line in lines:
+        for match in _PLUGIN_FEATURES_RE.finditer(line):
+            found.add(match.group())
+        # Trovati tutti: inutile leggere il resto del file
+        if found >= _REQUIRED_FEATURES:
+            break
+    # '(PluginBase)' contiene anche 'PluginBase'
+    if '(PluginBase)' in found:
+        found.add('PluginBase')
+    return found
+
 class DiagnosticsPlugin(PluginBase):
     """
     Plugin di diagnostica per mostrare informazioni sul sistema dei plugin
@@ -41,8 +73,11 @@ class DiagnosticsPlugin(PluginBase):
     
     def add_diagnostics_button(self, gui, **kwargs):
         """Aggiunge un pulsante per le diagnostiche all'interfaccia"""
-        # Aggiungi un pulsante nella barra degli strumenti
-        control_frame = gui.root.winfo_children()[0].winfo_children()[0]
+        _import_tk()
+        
+        # Aggiungi un pulsante nella barra degli strumenti; le versioni dell'interfaccia
+        # che non espongono toolbar_frame vengono risolte percorrendo i widget
+        control_frame = getattr(gui, 'toolbar_frame', None) or gui.root.winfo_children()[0].winfo_children()[0]
         diag_button = ttk.Button(control_frame, text="Diagnostica", command=lambda: self.show_diagnostics(gui))
         diag_button.grid(row=0, column=7, padx=5)
     
@@ -82,28 +117,32 @@ class DiagnosticsPlugin(PluginBase):
         info_text = scrolledtext.ScrolledText(frame, wrap=tk.WORD)
         info_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        info_text.insert(tk.END, "=== Informazioni di Sistema ===\n\n")
+        # Il testo viene accumulato e inserito con una sola chiamata a Tk
+        parts = []
+        
+        parts.append("=== Informazioni di Sistema ===\n\n")
         
         # Info sulla directory corrente
-        info_text.insert(tk.END, f"Directory di lavoro: {os.getcwd()}\n")
-        info_text.insert(tk.END, f"Directory plugins: {os.path.join(os.getcwd(), 'plugins')}\n\n")
+        parts.append(f"Directory di lavoro: {os.getcwd()}\n")
+        parts.append(f"Directory plugins: {os.path.join(os.getcwd(), 'plugins')}\n\n")
         
         # Info sul Python path
-        info_text.insert(tk.END, "=== Python Path ===\n")
+        parts.append("=== Python Path ===\n")
         import sys
         for path in sys.path:
-            info_text.insert(tk.END, f"- {path}\n")
+            parts.append(f"- {path}\n")
         
-        info_text.insert(tk.END, "\n=== Informazioni sull'analizzatore ===\n")
-        info_text.insert(tk.END, f"Plugin caricati: {len(gui.analyzer.plugin_manager.plugins)}\n")
+        parts.append("\n=== Informazioni sull'analizzatore ===\n")
+        parts.append(f"Plugin caricati: {len(gui.analyzer.plugin_manager.plugins)}\n")
         
         # Info sugli hook registrati
-        info_text.insert(tk.END, "\n=== Hook registrati ===\n")
+        parts.append("\n=== Hook registrati ===\n")
         for hook_name, handlers in gui.analyzer.plugin_manager.hooks.items():
-            info_text.insert(tk.END, f"Hook '{hook_name}': {len(handlers)} handler(s)\n")
+            parts.append(f"Hook '{hook_name}': {len(handlers)} handler(s)\n")
             for plugin_id, method in handlers:
-                info_text.insert(tk.END, f"  - {plugin_id}.{method.__name__}\n")
+                parts.append(f"  - {plugin_id}.{method.__name__}\n")
         
+        info_text.insert(tk.END, ''.join(parts))
         info_text.config(state=tk.DISABLED)  # Rendi di sola lettura
     
     def _populate_plugins_info(self, frame, gui):
@@ -111,42 +150,46 @@ class DiagnosticsPlugin(PluginBase):
         info_text = scrolledtext.ScrolledText(frame, wrap=tk.WORD)
         info_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
-        info_text.insert(tk.END, "=== Plugin caricati ===\n\n")
+        # Il testo viene accumulato e inserito con una sola chiamata a Tk
+        parts = []
+        
+        parts.append("=== Plugin caricati ===\n\n")
         
         if not gui.analyzer.plugin_manager.plugins:
-            info_text.insert(tk.END, "Nessun plugin caricato!\n\n")
-            info_text.insert(tk.END, "Possibili cause:\n")
-            info_text.insert(tk.END, "1. La cartella 'plugins' non esiste o è vuota\n")
-            info_text.insert(tk.END, "2. I file plugin non contengono classi che ereditano da PluginBase\n")
-            info_text.insert(tk.END, "3. Ci sono errori di sintassi nei file plugin\n")
-            info_text.insert(tk.END, "4. I plugin hanno dipendenze non soddisfatte\n\n")
-            info_text.insert(tk.END, "Consulta la scheda 'File nella cartella plugins' per ulteriori informazioni.")
+            parts.append("Nessun plugin caricato!\n\n")
+            parts.append("Possibili cause:\n")
+            parts.append("1. La cartella 'plugins' non esiste o è vuota\n")
+            parts.append("2. I file plugin non contengono classi che ereditano da PluginBase\n")
+            parts.append("3. Ci sono errori di sintassi nei file plugin\n")
+            parts.append("4. I plugin hanno dipendenze non soddisfatte\n\n")
+            parts.append("Consulta la scheda 'File nella cartella plugins' per ulteriori informazioni.")
         else:
             for plugin_id, plugin in gui.analyzer.plugin_manager.plugins.items():
-                info_text.insert(tk.END, f"Plugin: {plugin.get_name()} (ID: {plugin_id})\n")
-                info_text.insert(tk.END, f"Descrizione: {plugin.get_description()}\n")
-                info_text.insert(tk.END, f"Versione: {plugin.get_version()}\n")
-                info_text.insert(tk.END, f"Autore: {plugin.get_author()}\n")
+                parts.append(f"Plugin: {plugin.get_name()} (ID: {plugin_id})\n")
+                parts.append(f"Descrizione: {plugin.get_description()}\n")
+                parts.append(f"Versione: {plugin.get_version()}\n")
+                parts.append(f"Autore: {plugin.get_author()}\n")
                 
                 # Mostra gli hook implementati
                 hooks = plugin.get_hooks()
                 if hooks:
-                    info_text.insert(tk.END, "Hook implementati:\n")
+                    parts.append("Hook implementati:\n")
                     for hook_name, methods in hooks.items():
                         for method in methods:
-                            info_text.insert(tk.END, f"  - {hook_name}: {method.__name__}\n")
+                            parts.append(f"  - {hook_name}: {method.__name__}\n")
                 else:
-                    info_text.insert(tk.END, "Nessun hook implementato!\n")
+                    parts.append("Nessun hook implementato!\n")
                 
                 # Mostra le dipendenze
                 deps = plugin.get_dependencies()
                 if deps:
-                    info_text.insert(tk.END, "Dipendenze:\n")
+                    parts.append("Dipendenze:\n")
                     for dep in deps:
-                        info_text.insert(tk.END, f"  - {dep}\n")
+                        parts.append(f"  - {dep}\n")
                 
-                info_text.insert(tk.END, "\n" + "-" * 50 + "\n\n")
+                parts.append("\n" + "-" * 50 + "\n\n")
         
+        info_text.insert(tk.END, ''.join(parts))
         info_text.config(state=tk.DISABLED)  # Rendi di sola lettura
     
     def _populate_files_info(self, frame):
@@ -154,70 +197,79 @@ class DiagnosticsPlugin(PluginBase):
         info_text = scrolledtext.ScrolledText(frame, wrap=tk.WORD)
         info_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
+        # Il testo viene accumulato e inserito con una sola chiamata a Tk
+        parts = []
+        
         plugins_dir = os.path.join(os.getcwd(), 'plugins')
         
-        info_text.insert(tk.END, f"=== File nella cartella {plugins_dir} ===\n\n")
+        parts.append(f"=== File nella cartella {plugins_dir} ===\n\n")
         
         if not os.path.exists(plugins_dir):
-            info_text.insert(tk.END, f"La cartella 'plugins' non esiste! Dovrebbe essere in: {plugins_dir}\n")
-            info_text.insert(tk.END, "Assicurati di creare questa cartella per i tuoi plugin.")
+            parts.append(f"La cartella 'plugins' non esiste! Dovrebbe essere in: {plugins_dir}\n")
+            parts.append("Assicurati di creare questa cartella per i tuoi plugin.")
+            info_text.insert(tk.END, ''.join(parts))
             return
         
-        files = os.listdir(plugins_dir)
+        # scandir restituisce nome, percorso e stat di ogni voce senza chiamate ripetute
+        with os.scandir(plugins_dir) as it:
+            entries = list(it)
         
-        if not files:
-            info_text.insert(tk.END, "La cartella 'plugins' è vuota. Nessun file trovato.\n")
+        if not entries:
+            parts.append("La cartella 'plugins' è vuota. Nessun file trovato.\n")
+            info_text.insert(tk.END, ''.join(parts))
             return
         
-        python_files = [f for f in files if f.endswith('.py') and not f.startswith('__')]
-        other_files = [f for f in files if not (f.endswith('.py') and not f.startswith('__'))]
+        python_files = [e for e in entries if e.name.endswith('.py') and not e.name.startswith('__')]
+        other_files = [e.name for e in entries if not (e.name.endswith('.py') and not e.name.startswith('__'))]
         
         if python_files:
-            info_text.insert(tk.END, "File Python trovati:\n")
-            for i, file in enumerate(python_files, 1):
-                file_path = os.path.join(plugins_dir, file)
-                file_size = os.path.getsize(file_path)
-                file_mod = os.path.getmtime(file_path)
-                import time
+            parts.append("File Python trovati:\n")
+            for i, entry in enumerate(python_files, 1):
+                file, file_path = entry.name, entry.path
+                # Una sola stat per dimensione e data di modifica
+                file_stat = entry.stat()
+                file_size = file_stat.st_size
+                file_mod = file_stat.st_mtime
                 mod_time = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(file_mod))
                 
-                info_text.insert(tk.END, f"{i}. {file}\n")
-                info_text.insert(tk.END, f"   - Dimensione: {file_size} byte\n")
-                info_text.insert(tk.END, f"   - Ultima modifica: {mod_time}\n")
+                parts.append(f"{i}. {file}\n")
+                parts.append(f"   - Dimensione: {file_size} byte\n")
+                parts.append(f"   - Ultima modifica: {mod_time}\n")
                 
                 # Analizza il contenuto del file
                 try:
                     with open(file_path, 'r', encoding='utf-8') as f:
-                        content = f.read()
+                        features = _find_plugin_features(f)
                     
                     # Controlla se il file importa PluginBase
-                    if "PluginBase" in content:
-                        info_text.insert(tk.END, f"   - Importa PluginBase: Sì\n")
+                    if "PluginBase" in features:
+                        parts.append(f"   - Importa PluginBase: Sì\n")
                     else:
-                        info_text.insert(tk.END, f"   - Importa PluginBase: No (problema!)\n")
+                        parts.append(f"   - Importa PluginBase: No (problema!)\n")
                     
                     # Controlla se ha classi che ereditano da PluginBase
-                    if "class" in content and "(PluginBase)" in content:
-                        info_text.insert(tk.END, f"   - Classe che eredita da PluginBase: Sì\n")
+                    if "class" in features and "(PluginBase)" in features:
+                        parts.append(f"   - Classe che eredita da PluginBase: Sì\n")
                     else:
-                        info_text.insert(tk.END, f"   - Classe che eredita da PluginBase: No (problema!)\n")
+                        parts.append(f"   - Classe che eredita da PluginBase: No (problema!)\n")
                     
                     # Controlla se implementa get_hooks
-                    if "def get_hooks" in content:
-                        info_text.insert(tk.END, f"   - Implementa get_hooks: Sì\n")
+                    if "def get_hooks" in features:
+                        parts.append(f"   - Implementa get_hooks: Sì\n")
                     else:
-                        info_text.insert(tk.END, f"   - Implementa get_hooks: No (problema!)\n")
+                        parts.append(f"   - Implementa get_hooks: No (problema!)\n")
                     
                 except Exception as e:
-                    info_text.insert(tk.END, f"   - Errore nell'analisi del file: {str(e)}\n")
+                    parts.append(f"   - Errore nell'analisi del file: {str(e)}\n")
                 
-                info_text.insert(tk.END, "\n")
+                parts.append("\n")
         else:
-            info_text.insert(tk.END, "Nessun file Python valido trovato nella cartella 'plugins'.\n\n")
+            parts.append("Nessun file Python valido trovato nella cartella 'plugins'.\n\n")
         
         if other_files:
-            info_text.insert(tk.END, "Altri file e cartelle trovati:\n")
+            parts.append("Altri file e cartelle trovati:\n")
             for i, file in enumerate(other_files, 1):
-                info_text.insert(tk.END, f"{i}. {file}\n")
+                parts.append(f"{i}. {file}\n")
         
+        info_text.insert(tk.END, ''.join(parts))
         info_text.config(state=tk.DISABLED)  # Rendi di sola lettura
\ No newline at end of file
@@ -3,9 +3,19 @@
 Plugin per la gestione dei plugin per PHP Analyzer
 """
 import os
-import tkinter as tk
-from tkinter import ttk, messagebox, filedialog, scrolledtext
 import json
+import queue
+import threading
+
+# Tkinter viene importato solo quando il plugin estende l'interfaccia grafica,
+# così il caricamento dei plugin in modalità riga di comando non carica Tk
+tk = ttk = messagebox = filedialog = scrolledtext = None
+
+def _import_tk():
+    """Importa i moduli Tkinter nei globali del modulo"""
+    global tk, ttk, messagebox, filedialog, scrolledtext
+    import tkinter as tk
+    from tkinter import ttk, messagebox, filedialog, scrolledtext
 
 try:
     from analizzatore import PluginBase
@@ -15,11 +25,25 @@ except ImportError:
         def get_id(self): pass
         def get_hooks(self): pass
 
+# Testo della colonna stato, indicizzato dal flag "enabled"
+_STATUS = ("Disabilitato", "Abilitato")
+
 class PluginManagerPlugin(PluginBase):
     """
     Plugin per la gestione dei plugin dell'analizzatore PHP
     """
     
+    def __init__(self):
+        # Metadati statici (nome, versione, autore) per ID plugin, letti una volta per popolamento
+        self._meta = {}
+        # Vero mentre un ricaricamento dei plugin è in corso nel thread di lavoro
+        self._reloading = False
+        # Aggiornamento dei dettagli in attesa e ID del plugin di cui sono mostrati i dettagli
+        self._pending_select = None
+        self._last_shown = None
+        # Finestra di gestione, riutilizzata tra un'apertura e l'altra
+        self._mgr_window = None
+    
     def get_id(self):
         return "plugin_manager_plugin"
         
@@ -47,8 +71,11 @@ class PluginManagerPlugin(PluginBase):
     
     def add_plugin_manager_button(self, gui, **kwargs):
         """Aggiunge un pulsante per il gestore plugin all'interfaccia"""
-        # Aggiungi un pulsante nella barra degli strumenti
-        control_frame = gui.root.winfo_children()[0].winfo_children()[0]
+        _import_tk()
+        
+        # Aggiungi un pulsante nella barra degli strumenti; le versioni dell'interfaccia
+        # che non espongono toolbar_frame vengono risolte percorrendo i widget
+        control_frame = getattr(gui, 'toolbar_frame', None) or gui.root.winfo_children()[0].winfo_children()[0]
         plugin_mgr_button = ttk.Button(
             control_frame, 
             text="Gestione Plugin", 
@@ -58,9 +85,17 @@ class PluginManagerPlugin(PluginBase):
     
     def show_plugin_manager(self, gui):
         """Mostra la finestra di gestione dei plugin"""
+        # La finestra viene creata una sola volta e poi solo nascosta e rimostrata
+        if self._mgr_window is not None and self._mgr_window.winfo_exists():
+            self._mgr_window.deiconify()
+            self._mgr_window.lift()
+            return
+        
         manager_window = tk.Toplevel(gui.root)
         manager_window.title("Gestione Plugin")
         manager_window.geometry("750x550")
+        manager_window.protocol("WM_DELETE_WINDOW", manager_window.withdraw)
+        self._mgr_window = manager_window
         
         # Frame principale
         main_frame = ttk.Frame(manager_window, padding="10")
@@ -182,40 +217,55 @@ class PluginManagerPlugin(PluginBase):
         # Popola la treeview con i plugin
         self._populate_plugin_tree(gui, tree)
         
-        # Evento di selezione nella treeview
-        tree.bind("<<TreeviewSelect>>", lambda e: self._on_tree_select(
-            tree, gui, description_var, hooks_var, deps_var))
+        # Evento di selezione nella treeview: gli eventi ravvicinati (ad esempio tenendo
+        # premuta una freccia) vengono raggruppati e i dettagli aggiornati una sola volta
+        def show_selected():
+            self._pending_select = None
+            self._on_tree_select(tree, gui, description_var, hooks_var, deps_var)
+        
+        def on_select(event):
+            if self._pending_select is not None:
+                manager_window.after_cancel(self._pending_select)
+            self._pending_select = manager_window.after(50, show_selected)
+        
+        tree.bind("<<TreeviewSelect>>", on_select)
         
         # Metti lo stato iniziale - nessun plugin selezionato
+        self._pending_select = None
+        self._last_shown = None
         description_var.set("")
         hooks_var.set("")
         deps_var.set("")
     
     def _populate_plugin_tree(self, gui, tree):
         """Popola la treeview con i plugin disponibili"""
-        # Pulisci prima la treeview
-        for item in tree.get_children():
-            tree.delete(item)
-            
-        # Aggiungi i plugin alla treeview
-        for plugin_id, plugin in gui.analyzer.plugin_manager.plugins.items():
+        # I metadati vengono riletti a ogni popolamento, ad esempio dopo un ricaricamento dei plugin
+        self._meta = {
+            plugin_id: (plugin.get_name(), plugin.get_version(), plugin.get_author())
+            for plugin_id, plugin in gui.analyzer.plugin_manager.plugins.items()
+        }
+        
+        # Le righe vengono preparate prima di toccare la treeview, così tra una
+        # chiamata a Tk e l'altra non c'è altro lavoro Python
+        rows = []
+        for plugin_id, meta in self._meta.items():
             # Verifica se c'è una configurazione per questo plugin
             config = gui.analyzer.plugin_manager.get_plugin_config(plugin_id)
             enabled = config.get("enabled", True)
-            
-            # Aggiungi alla treeview
-            tree.insert("", tk.END, values=(
-                plugin_id,
-                plugin.get_name(),
-                plugin.get_version(),
-                plugin.get_author(),
-                "Abilitato" if enabled else "Disabilitato"
-            ))
+            rows.append((plugin_id, *meta, _STATUS[bool(enabled)]))
+        
+        # Pulisci prima la treeview, con una sola chiamata per tutti gli elementi
+        tree.delete(*tree.get_children())
+        
+        # Aggiungi i plugin alla treeview
+        for values in rows:
+            tree.insert("", tk.END, values=values)
     
     def _on_tree_select(self, tree, gui, desc_var, hooks_var, deps_var):
         """Gestisce l'evento di selezione nella treeview"""
         selection = tree.selection()
         if not selection:
+            self._last_shown = None
             desc_var.set("")
             hooks_var.set("")
             deps_var.set("")
@@ -225,10 +275,15 @@ class PluginManagerPlugin(PluginBase):
         item = selection[0]
         plugin_id = tree.item(item, "values")[0]
         
+        # I dettagli di questo plugin sono già visualizzati
+        if plugin_id == self._last_shown:
+            return
+        
         # Ottieni il plugin
         plugin = gui.analyzer.plugin_manager.plugins.get(plugin_id)
         if not plugin:
             return
+        self._last_shown = plugin_id
             
         # Aggiorna le variabili di testo
         desc_var.set(plugin.get_description())
@@ -265,16 +320,16 @@ class PluginManagerPlugin(PluginBase):
         config["enabled"] = enable
         gui.analyzer.plugin_manager.save_plugin_config(plugin_id, config)
         
-        # Aggiorna la treeview
+        # Aggiorna la treeview con i metadati già letti durante il popolamento
         tree.item(item, values=(
             plugin_id,
-            gui.analyzer.plugin_manager.plugins[plugin_id].get_name(),
-            gui.analyzer.plugin_manager.plugins[plugin_id].get_version(),
-            gui.analyzer.plugin_manager.plugins[plugin_id].get_author(),
-            "Abilitato" if enable else "Disabilitato"
+            *self._meta[plugin_id],
+            _STATUS[bool(enable)]
         ))
         
-        # Aggiorna anche le variabili di testo in caso di modifiche
+        # Aggiorna anche le variabili di testo in caso di modifiche: la selezione non è
+        # cambiata, quindi va invalidata per non essere scartata da _on_tree_select
+        self._last_shown = None
         self._on_tree_select(tree, gui, desc_var, hooks_var, deps_var)
         
         messagebox.showinfo("Stato Plugin", 
@@ -329,6 +384,10 @@ class PluginManagerPlugin(PluginBase):
         config_text.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E, tk.N, tk.S))
         config_text.insert("1.0", json.dumps(merged_config, indent=4))
         
+        # JSON dei predefiniti serializzato una sola volta: "Ripristina Predefiniti"
+        # sostituisce il testo con una sola chiamata invece di delete + insert
+        default_json = json.dumps(default_config, indent=4)
+        
         # Frame per i pulsanti
         button_frame = ttk.Frame(main_frame)
         button_frame.grid(row=4, column=0, columnspan=2, pady=10)
@@ -344,8 +403,7 @@ class PluginManagerPlugin(PluginBase):
         ttk.Button(
             button_frame, 
             text="Ripristina Predefiniti", 
-            command=lambda: config_text.delete("1.0", tk.END) or 
-                            config_text.insert("1.0", json.dumps(default_config, indent=4))
+            command=lambda: config_text.replace("1.0", tk.END, default_json)
         ).grid(row=0, column=1, padx=5)
         
         ttk.Button(
@@ -379,26 +437,97 @@ class PluginManagerPlugin(PluginBase):
             messagebox.showerror("Errore", f"Errore durante il salvataggio: {str(e)}")
     
     def _reload_plugins(self, gui, tree, desc_var, hooks_var, deps_var):
-        """Ricarica tutti i plugin"""
-        try:
-            gui.analyzer.plugin_manager.load_plugins()
-            messagebox.showinfo("Plugin", f"Caricati {len(gui.analyzer.plugin_manager.plugins)} plugin")
+        """Ricarica tutti i plugin in un thread separato, senza bloccare l'interfaccia"""
+        # Un ricaricamento alla volta
+        if self._reloading:
+            return
+        self._reloading = True
+        
+        # Barra di avanzamento indeterminata finché il caricamento non termina
+        progress = ttk.Progressbar(tree.master, mode='indeterminate')
+        progress.grid(row=3, column=0, columnspan=2, sticky=(tk.W, tk.E))
+        progress.start(10)
+        
+        def on_done(error):
+            # Eseguito nel thread dell'interfaccia tramite root.after
+            self._reloading = False
+            progress.stop()
+            progress.destroy()
+            
+            if error is not None:
+                messagebox.showerror("Errore", f"Errore durante il ricaricamento: {str(error)}")
+                return
             
             # Aggiorna la treeview
             self._populate_plugin_tree(gui, tree)
             
             # Resetta le variabili di dettaglio
+            self._last_shown = None
             desc_var.set("")
             hooks_var.set("")
             deps_var.set("")
             
-        except Exception as e:
-            messagebox.showerror("Errore", f"Errore durante il ricaricamento: {str(e)}")
+            messagebox.showinfo("Plugin", f"Caricati {len(gui.analyzer.plugin_manager.plugins)} plugin")
+        
+        def worker():
+            try:
+                gui.analyzer.plugin_manager.load_plugins()
+            except Exception as e:
+                gui.root.after(0, lambda err=e: on_done(err))
+            else:
+                gui.root.after(0, lambda: on_done(None))
+        
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
     
     def _diagnose_plugins(self, gui):
-        """Esegue la diagnostica dei plugin"""
-        gui.analyzer.plugin_manager.diagnose_plugins_directory()
-        messagebox.showinfo("Diagnostica", "Diagnostica completata. Controlla la console per i dettagli.")
+        """Esegue la diagnostica dei plugin in un thread separato e ne mostra l'output in una finestra"""
+        diag_window = tk.Toplevel(gui.root)
+        diag_window.title("Diagnostica Plugin")
+        diag_window.geometry("600x400")
+        
+        output_text = scrolledtext.ScrolledText(diag_window, wrap=tk.WORD)
+        output_text.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
+        
+        # Le linee prodotte dal thread arrivano tramite la coda; None segnala la fine
+        lines = queue.Queue()
+        
+        def worker():
+            try:
+                gui.analyzer.plugin_manager.diagnose_plugins_directory(out=lines.put)
+            except Exception as e:
+                lines.put(f"Errore durante la diagnostica: {str(e)}")
+            lines.put(None)
+        
+        def drain():
+            # Eseguito nel thread dell'interfaccia: inserisce con una sola chiamata
+            # tutte le linee arrivate dall'ultimo controllo
+            if not diag_window.winfo_exists():
+                return
+            parts = []
+            done = False
+            while True:
+                try:
+                    line = lines.get_nowait()
+                except queue.Empty:
+                    break
+                if line is None:
+                    done = True
+                    break
+                parts.append(line + "\n")
+            if parts:
+                output_text.insert(tk.END, ''.join(parts))
+                output_text.see(tk.END)
+            if done:
+                output_text.config(state=tk.DISABLED)  # Rendi di sola lettura
+            else:
+                diag_window.after(50, drain)
+        
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        drain()
     
     def _browse_plugins_dir(self, string_var):
         """Permette di selezionare la directory dei plugin"""